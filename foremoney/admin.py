@@ -0,0 +1,139 @@
+import asyncio
+import os
+import resource
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from .rate_limiter import BULK
+
+
+def process_rss() -> int:
+    """Return the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def parse_profile_args(args: list[str]) -> tuple[int | None, float | None, bool]:
+    """Parse ``[N] [Ts] [mem]`` into (updates, seconds, memory)."""
+    updates = seconds = None
+    memory = False
+    for arg in args:
+        if arg.lower() == "mem":
+            memory = True
+        elif arg.lower().endswith("s"):
+            seconds = float(arg[:-1])
+        else:
+            updates = int(arg)
+        if (updates is not None and updates <= 0) or (seconds is not None and seconds <= 0):
+            raise ValueError(arg)
+    if updates is None and seconds is None:
+        updates = 20
+    return updates, seconds, memory
+
+
+class AdminMixin:
+    """Operator commands restricted to ``Settings.admin_ids``."""
+
+    def is_admin(self, update: Update) -> bool:
+        user = update.effective_user
+        return user is not None and user.id in self.settings.admin_ids
+
+    def active_conversations(self) -> int:
+        # ConversationHandler keeps one entry per conversation until it ends
+        return sum(len(conv._conversations) for conv in self.conversations)
+
+    async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not self.is_admin(update):
+            return
+        storage = await asyncio.to_thread(self.db.stats)
+        window = self.settings.stats_window
+        calls, (p50, p95) = self.metrics.recent_latency(window * 60)
+        lines = [
+            f"DB: {format_bytes(storage['db_bytes'])}, WAL: {format_bytes(storage['wal_bytes'])}",
+            "Rows: " + ", ".join(f"{table} {count}" for table, count in storage["rows"].items()),
+        ]
+        for name, (hits, misses) in storage["caches"].items():
+            total = hits + misses
+            rate = f"{hits / total:.0%}" if total else "-"
+            lines.append(f"Cache {name}: {rate} of {total}")
+        lines.append(
+            f"Handlers, last {window} min: {calls} calls, "
+            f"p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms"
+        )
+        lines.append(f"Active conversations: {self.active_conversations()}")
+        lines.append(
+            f"Updates in flight: {self.update_processor.in_flight}, "
+            f"users with pending updates: {len(self.update_processor.user_locks)}"
+        )
+        lines.append(f"RSS: {format_bytes(process_rss())}")
+        writes = self.writes.metrics()
+        lines.append(
+            f"Write batches: {writes['batches']} for {writes['requests']} writes, "
+            f"largest {writes['largest_batch']}"
+        )
+        if self.rate_limiter is not None:
+            sends = self.rate_limiter.metrics()
+            lines.append(
+                f"Outgoing: {sends['sent']} sent, {sends['coalesced']} merged, "
+                f"{sends['retries']} flood retries, {sends['queued']} queued"
+            )
+        if self.tracer is not None:
+            trace = self.tracer.metrics()
+            lines.append(
+                f"SQL: {trace['statements']} statements in {trace['updates']} updates, "
+                f"{trace['n_plus_one']} repeated-statement warnings"
+            )
+        if self.backups is not None:
+            backup = self.backups.metrics()
+            lines.append(
+                f"Backups: {backup['snapshots']} ok, {backup['failures']} failed, "
+                f"{backup['restarts']} restarts, last {backup['last_finished'] or '-'}"
+            )
+            if backup["last_duration_seconds"] is not None:
+                lines.append(
+                    f"Last backup: {backup['last_duration_seconds']:.1f} s, "
+                    f"{format_bytes(backup['last_size_bytes'])}"
+                )
+        await update.message.reply_text("\n".join(lines))
+
+    async def profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not self.is_admin(update):
+            return
+        try:
+            updates, seconds, memory = parse_profile_args(context.args or [])
+        except ValueError:
+            await update.message.reply_text(
+                "Usage: /profile [updates] [seconds]s [mem], e.g. /profile 50 or /profile 30s mem"
+            )
+            return
+        if self.profiler.running:
+            await update.message.reply_text("Profiling is already running")
+            return
+        chat_id = update.effective_chat.id
+        bot = context.bot
+
+        async def send(report: bytes) -> None:
+            await bot.send_document(
+                chat_id, document=report, filename="profile.txt", rate_limit_args=BULK
+            )
+
+        self.profiler.start(send, updates=updates, seconds=seconds, memory=memory)
+        window = " or ".join(
+            part for part in (
+                f"{updates} updates" if updates else "",
+                f"{seconds:g}s" if seconds else "",
+            ) if part
+        )
+        await update.message.reply_text(f"Profiling the next {window}")
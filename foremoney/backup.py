@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class _Restarted(Exception):
+    """Raised from the progress callback to give up a paced copy."""
+
+
+class BackupManager:
+    """Write rotated snapshots of live SQLite databases.
+
+    ``sources`` returns the database files to copy (one file, or the
+    directory plus every family shard in sharded mode). Snapshots are taken
+    with ``sqlite3.Connection.backup`` on a dedicated connection, copying
+    ``pages`` pages per step and sleeping ``sleep`` seconds between steps so
+    the bot keeps serving writes meanwhile.
+
+    A write from another connection makes SQLite restart the copy from the
+    first page. After ``max_restarts`` restarts the file is copied again in
+    a single step instead: it reads one consistent snapshot, which in WAL
+    mode does not block writers and cannot be restarted.
+    """
+
+    def __init__(
+        self,
+        sources: Callable[[], Iterable[Path]],
+        backup_dir: Path,
+        keep: int = 7,
+        pages: int = 256,
+        sleep: float = 0.05,
+        max_restarts: int = 3,
+    ) -> None:
+        self.sources = sources
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self.max_restarts = max_restarts
+        self.snapshots = 0
+        self.failures = 0
+        self.restarts = 0
+        self.single_step_copies = 0
+        self.last_paths: list[Path] = []
+        self.last_duration: float | None = None
+        self.last_size: int | None = None
+        self.last_finished: datetime | None = None
+
+    def _copy(self, db_path: Path, stamp: str) -> Path:
+        target = self.backup_dir / f"{db_path.stem}-{stamp}.sqlite3"
+        partial = target.with_name(target.name + ".part")
+        last_remaining: int | None = None
+        restarts = 0
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            nonlocal last_remaining, restarts
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                self.restarts += 1
+                if restarts > self.max_restarts:
+                    raise _Restarted
+            last_remaining = remaining
+            if remaining:
+                time.sleep(self.sleep)
+
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(partial)
+        try:
+            try:
+                src.backup(dst, pages=self.pages, progress=progress)
+            except _Restarted:
+                logger.info("Backup of %s restarted %d times, copying in one step", db_path, restarts - 1)
+                self.single_step_copies += 1
+                src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        partial.replace(target)
+        self._rotate(db_path)
+        return target
+
+    def snapshot(self) -> list[Path]:
+        """Copy every database into a new snapshot file and rotate old ones."""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        start = time.monotonic()
+        written = [self._copy(Path(p), stamp) for p in self.sources()]
+        self.last_duration = time.monotonic() - start
+        self.last_size = sum(p.stat().st_size for p in written)
+        self.last_paths = written
+        self.last_finished = datetime.now()
+        self.snapshots += 1
+        return written
+
+    def _rotate(self, db_path: Path) -> None:
+        pattern = f"{db_path.stem}-*.sqlite3"
+        files = sorted(self.backup_dir.glob(pattern))
+        for old in files[: max(len(files) - self.keep, 0)]:
+            old.unlink(missing_ok=True)
+
+    async def run(self) -> list[Path]:
+        """Take snapshots in a worker thread without blocking the event loop."""
+        try:
+            paths = await asyncio.to_thread(self.snapshot)
+        except (sqlite3.Error, OSError):
+            self.failures += 1
+            logger.exception("Backup failed")
+            return []
+        logger.info(
+            "Backup of %d database(s) written in %.2fs (%d bytes)",
+            len(paths),
+            self.last_duration,
+            self.last_size,
+        )
+        return paths
+
+    def metrics(self) -> dict[str, Any]:
+        """Return counters describing the most recent snapshots."""
+        return {
+            "snapshots": self.snapshots,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "single_step_copies": self.single_step_copies,
+            "last_duration_seconds": self.last_duration,
+            "last_size_bytes": self.last_size,
+            "last_paths": [str(p) for p in self.last_paths],
+            "last_finished": self.last_finished.isoformat(sep=" ") if self.last_finished else None,
+        }
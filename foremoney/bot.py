@@ -1,6 +1,9 @@
+import asyncio
+
 from telegram.ext import (
     Application,
     CommandHandler,
+    ContextTypes,
     ConversationHandler,
     MessageHandler,
     CallbackQueryHandler,
@@ -8,7 +11,15 @@ from telegram.ext import (
 )
 
 from .config import get_settings
-from .database import Database
+from .storage import open_storage
+from .backup import BackupManager
+from .write_queue import WriteQueue
+from .tracing import QueryTracer
+from .metrics import Metrics, TimedRequest, instrument_handlers
+from .profiling import Profiler
+from .update_processor import BotUpdateProcessor
+from .persistence import SQLitePersistence, state_path
+from .rate_limiter import RateLimiter
 from .states import *  # noqa: F401,F403
 from .menu import MenuMixin
 from .dashboard import DashboardMixin
@@ -17,6 +28,9 @@ from .settings_dashboard import SettingsDashboardMixin
 from .settings_groups import SettingsGroupsMixin
 from .settings_accounts import SettingsAccountsMixin
 from .settings_family import SettingsFamilyMixin
+from .admin import AdminMixin
+from .quick_entry import QUICK_ENTRY_PATTERN, QuickEntryMixin
+from .bulk_entry import BULK_ENTRY_PATTERN, BulkEntryMixin
 
 
 class FinanceBot(
@@ -27,15 +41,100 @@ class FinanceBot(
     SettingsGroupsMixin,
     SettingsAccountsMixin,
     SettingsFamilyMixin,
+    AdminMixin,
+    QuickEntryMixin,
+    BulkEntryMixin,
     MenuMixin,
 ):
     def __init__(self) -> None:
         self.settings = get_settings()
-        self.db = Database(self.settings.database_path)
+        self.tracer: QueryTracer | None = None
+        if self.settings.sql_trace:
+            self.tracer = QueryTracer(self.settings.sql_repeat_threshold)
+        self.db = open_storage(self.settings, self.tracer)
+        self.metrics = Metrics()
+        self.profiler = Profiler()
+        self.update_processor = BotUpdateProcessor(
+            self.tracer,
+            self.profiler,
+            max_concurrent_updates=self.settings.max_concurrent_updates,
+        )
+        self._metrics_server = None
+        self.backups: BackupManager | None = None
+        if self.settings.backup_dir:
+            self.backups = BackupManager(
+                lambda: self.db.paths(),
+                self.settings.backup_dir,
+                keep=self.settings.backup_keep,
+                pages=self.settings.backup_pages,
+                sleep=self.settings.backup_sleep,
+            )
+            self.metrics.backups = self.backups.metrics
+
+        self.rate_limiter: RateLimiter | None = None
+        if self.settings.rate_limit_global > 0 and self.settings.rate_limit_chat > 0:
+            self.rate_limiter = RateLimiter(
+                self.settings.rate_limit_global, self.settings.rate_limit_chat
+            )
+        self.persistence: SQLitePersistence | None = None
+        if self.settings.persistence_interval > 0 and self.settings.storage_backend != "memory":
+            self.persistence = SQLitePersistence(
+                state_path(self.settings.database_path), self.settings.persistence_interval
+            )
+
+        self.writes = WriteQueue(
+            self.db,
+            max_latency=self.settings.write_batch_latency,
+            max_batch=self.settings.write_batch_size,
+        )
+
+    async def post_init(self, application: Application) -> None:
+        if self.settings.write_batch_latency > 0:
+            await self.writes.start()
+        if self.settings.metrics_port:
+            self._metrics_server = await self.metrics.serve(self.settings.metrics_port)
+
+    async def post_shutdown(self, application: Application) -> None:
+        await self.writes.stop()
+        if self._metrics_server:
+            self._metrics_server.close()
+            await self._metrics_server.wait_closed()
+
+    async def metrics_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.metrics.write(self.settings.metrics_file)
+
+    async def backup_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.backups.run()
+
+    async def snapshot_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # one family at a time, off the event loop and between its writes
+        for family_id in self.db.family_ids():
+            target = self.db.shard_for(family_id)
+            async with self.writes.exclusive(family_id):
+                await asyncio.to_thread(target.rebuild_family_snapshots, family_id)
 
     def build_app(self) -> Application:
-        application = Application.builder().token(self.settings.token).build()
+        builder = (
+            Application.builder()
+            .token(self.settings.token)
+            .concurrent_updates(self.update_processor)
+            .request(TimedRequest(self.metrics))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        if self.persistence is not None:
+            builder = builder.persistence(self.persistence)
+        if self.rate_limiter is not None:
+            builder = builder.rate_limiter(self.rate_limiter)
+        application = builder.build()
+        persistent = self.persistence is not None
         application.add_handler(CommandHandler("start", self.start))
+        application.add_handler(CommandHandler("stats", self.stats))
+        application.add_handler(CommandHandler("profile", self.profile))
+        application.add_handler(CommandHandler("tx", self.quick_tx_command))
+        application.add_handler(CallbackQueryHandler(self.quick_tx_choice, pattern="^qtx:"))
+        application.add_handler(CommandHandler("bulk", self.bulk_command))
+        application.add_handler(CallbackQueryHandler(self.bulk_choice, pattern="^bulk:"))
 
         create_tx_conv = ConversationHandler(
             entry_points=[MessageHandler(filters.Regex("^Create transaction$"), self.start_create_transaction)],
@@ -53,6 +152,8 @@ class FinanceBot(
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
             allow_reentry=True,
+            name="create_tx",
+            persistent=persistent,
         )
         application.add_handler(create_tx_conv)
 
@@ -75,6 +176,8 @@ class FinanceBot(
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
             allow_reentry=True,
+            name="tx",
+            persistent=persistent,
         )
         application.add_handler(tx_conv)
 
@@ -88,6 +191,8 @@ class FinanceBot(
                 DASH_GROUP_MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.dashboard_group_menu)],
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
+            name="dashboard",
+            persistent=persistent,
         )
         application.add_handler(dashboard_conv)
 
@@ -134,21 +239,70 @@ class FinanceBot(
                     MessageHandler(filters.Document.ALL, self.import_data_file),
                     MessageHandler(filters.TEXT & ~filters.COMMAND, self.import_data_file),
                 ],
+                CLOSE_PERIOD_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.close_period_date)],
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
+            name="settings",
+            persistent=persistent,
         )
         application.add_handler(settings_conv)
+        self.conversations = [create_tx_conv, tx_conv, dashboard_conv, settings_conv]
 
+        application.add_handler(
+            MessageHandler(filters.Regex(QUICK_ENTRY_PATTERN) & ~filters.COMMAND, self.quick_tx_text)
+        )
+        application.add_handler(
+            MessageHandler(filters.Regex(BULK_ENTRY_PATTERN) & ~filters.COMMAND, self.bulk_text)
+        )
+        application.add_handler(
+            MessageHandler(
+                filters.Document.TXT | filters.Document.FileExtension("csv"), self.bulk_file
+            )
+        )
         application.add_handler(
             MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu)
         )
+        instrument_handlers(application, self.metrics)
+        if self.settings.metrics_file:
+            application.job_queue.run_repeating(
+                self.metrics_job,
+                interval=self.settings.metrics_interval,
+                first=self.settings.metrics_interval,
+                name="metrics",
+            )
+        if self.backups:
+            application.job_queue.run_repeating(
+                self.backup_job,
+                interval=self.settings.backup_interval,
+                first=self.settings.backup_interval,
+                name="backup",
+            )
+        if self.settings.snapshot_rebuild_interval:
+            application.job_queue.run_repeating(
+                self.snapshot_job,
+                interval=self.settings.snapshot_rebuild_interval,
+                first=self.settings.snapshot_rebuild_interval,
+                name="snapshot_rebuild",
+            )
         return application
 
 
 def main() -> None:
     bot = FinanceBot()
     app = bot.build_app()
-    app.run_polling()
+    settings = bot.settings
+    if settings.webhook_url:
+        # Telegram gets its 200 as soon as the update is queued; handlers
+        # run afterwards in the update processor
+        app.run_webhook(
+            listen=settings.webhook_listen,
+            port=settings.webhook_port,
+            url_path=settings.webhook_path,
+            secret_token=settings.webhook_secret,
+            webhook_url=f"{settings.webhook_url.rstrip('/')}/{settings.webhook_path}",
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
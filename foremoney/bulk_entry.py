@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime
+from io import BytesIO
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from .money import format_amount, parse_amount
+from .name_index import NameIndex
+from .quick_entry import parse_quick_entry
+from .ui import inline_keyboard
+
+USAGE = (
+    "Send one transaction per line, e.g.\n"
+    "2024-05-01 12.50 debit card > Food\n"
+    "2024-05-01 18:30 4 cash > Transport\n"
+    "2024-05-02,30,Salary,debit card"
+)
+# plain messages starting with a date are handled as bulk entries
+BULK_ENTRY_PATTERN = r"^\s*\d{4}-\d{2}-\d{2}[ T,;\t]"
+MAX_LINES = 500
+MAX_FILE_SIZE = 256 * 1024
+MAX_ERRORS_SHOWN = 20
+
+CONFIRM_KEYBOARD = inline_keyboard((
+    (("Save", "bulk:save"), ("Cancel", "bulk:cancel")),
+))
+
+_DATED = re.compile(r"\s*(\d{4}-\d{2}-\d{2})(?:[ T](\d{1,2}:\d{2}))?\s+(.+)")
+
+
+def parse_timestamp(day: str, time: str | None) -> str:
+    value = datetime.strptime(f"{day} {time or '00:00'}", "%Y-%m-%d %H:%M")
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_bulk_line(line: str) -> tuple[str, int, str, str]:
+    """Return ``(ts, amount, from_name, to_name)`` of one line.
+
+    Lines are either ``DATE [HH:MM] AMOUNT FROM > TO`` or four
+    comma, semicolon or tab separated fields ``DATE,AMOUNT,FROM,TO``.
+    """
+    if ">" in line:
+        match = _DATED.fullmatch(line)
+        if not match:
+            raise ValueError("expected DATE [HH:MM] AMOUNT FROM > TO")
+        day, time = match.group(1), match.group(2)
+        try:
+            ts = parse_timestamp(day, time)
+        except ValueError:
+            raise ValueError(f"invalid date '{day} {time}'" if time else f"invalid date '{day}'") from None
+        amount, from_name, to_name = parse_quick_entry(match.group(3))
+        return ts, amount, from_name, to_name
+    sep = "\t" if "\t" in line else ";" if ";" in line else ","
+    fields = [field.strip() for field in line.split(sep)]
+    if len(fields) != 4 or not all(fields):
+        raise ValueError("expected DATE,AMOUNT,FROM,TO")
+    day, _, time = fields[0].partition(" ")
+    try:
+        ts = parse_timestamp(day, time or None)
+    except ValueError:
+        raise ValueError(f"invalid date '{fields[0]}'") from None
+    try:
+        amount = parse_amount(fields[1])
+    except ValueError:
+        raise ValueError(f"invalid amount '{fields[1]}'") from None
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    return ts, amount, fields[2], fields[3]
+
+
+def resolve(index: NameIndex, name: str) -> int:
+    ids = index.lookup(name)
+    if not ids:
+        raise ValueError(f"no account matches '{name}'")
+    if len(ids) > 1:
+        names = ", ".join(index.labels[i] for i in ids[:4])
+        raise ValueError(f"'{name}' is ambiguous ({names})")
+    return ids[0]
+
+
+def validate(index: NameIndex, text: str) -> tuple[list[list], list[str]]:
+    """Return the valid rows ``[from_id, to_id, amount, ts]`` and line errors."""
+    rows: list[list] = []
+    errors: list[str] = []
+    lines = text.splitlines()
+    for number, line in enumerate(lines[:MAX_LINES], 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            ts, amount, from_name, to_name = parse_bulk_line(line)
+            from_id = resolve(index, from_name)
+            to_id = resolve(index, to_name)
+            if from_id == to_id:
+                raise ValueError("source and destination are the same account")
+        except ValueError as exc:
+            errors.append(f"line {number}: {exc}")
+            continue
+        rows.append([from_id, to_id, amount, ts])
+    return rows, errors
+
+
+class BulkEntryMixin:
+    """Create many transactions from a multi-line message or a text file.
+
+    All lines are checked before anything is written; the valid ones are
+    saved after confirmation through a single ``add_transactions`` call.
+    """
+
+    async def bulk_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        parts = update.message.text.split(None, 1)
+        text = parts[1] if len(parts) > 1 else ""
+        if not text.strip():
+            await update.message.reply_text(USAGE)
+            return
+        await self._bulk_prepare(update, context, text)
+
+    async def bulk_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self._bulk_prepare(update, context, update.message.text)
+
+    async def bulk_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        doc = update.message.document
+        if doc.file_size and doc.file_size > MAX_FILE_SIZE:
+            await update.message.reply_text("The file is too large")
+            return
+        file = await doc.get_file()
+        buf = BytesIO()
+        await file.download_to_memory(buf)
+        try:
+            text = buf.getvalue().decode("utf-8-sig")
+        except UnicodeDecodeError:
+            await update.message.reply_text("Please send a UTF-8 text file")
+            return
+        await self._bulk_prepare(update, context, text)
+
+    async def _bulk_prepare(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+        index = self.db.name_index(update.effective_user.id)
+        rows, errors = validate(index, text)
+        lines = []
+        if rows:
+            total = sum(row[2] for row in rows)
+            lines.append(f"{len(rows)} transactions, total {format_amount(total)}")
+        else:
+            lines.append("No valid transactions")
+        if errors:
+            lines.append(f"{len(errors)} lines skipped:")
+            lines.extend(errors[:MAX_ERRORS_SHOWN])
+            if len(errors) > MAX_ERRORS_SHOWN:
+                lines.append(f"... and {len(errors) - MAX_ERRORS_SHOWN} more")
+        if len(text.splitlines()) > MAX_LINES:
+            lines.append(f"Only the first {MAX_LINES} lines were read")
+        if not rows:
+            context.user_data.pop("bulk_rows", None)
+            await update.message.reply_text("\n".join(lines))
+            return
+        context.user_data["bulk_rows"] = rows
+        await update.message.reply_text("\n".join(lines), reply_markup=CONFIRM_KEYBOARD)
+
+    async def bulk_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        await query.answer()
+        rows = context.user_data.pop("bulk_rows", None)
+        if query.data == "bulk:cancel":
+            await query.edit_message_text("Cancelled")
+            return
+        if not rows:
+            await query.edit_message_text("Nothing to save")
+            return
+        ids = await self.writes.submit(update.effective_user.id, "add_transactions", rows)
+        await query.edit_message_text(f"Saved {len(ids)} transactions")
@@ -8,6 +8,32 @@ import os
 class Settings:
     token: str
     database_path: Path
+    storage_backend: str = "sqlite"
+    shard_dir: Path | None = None
+    backup_dir: Path | None = None
+    backup_interval: int = 3600
+    backup_keep: int = 7
+    backup_pages: int = 256
+    backup_sleep: float = 0.05
+    snapshot_rebuild_interval: int = 86400
+    write_batch_latency: float = 0.01
+    write_batch_size: int = 200
+    sql_trace: bool = False
+    sql_repeat_threshold: int = 20
+    metrics_port: int | None = None
+    metrics_file: Path | None = None
+    metrics_interval: int = 60
+    admin_ids: frozenset[int] = frozenset()
+    stats_window: int = 15
+    max_concurrent_updates: int = 16
+    webhook_url: str | None = None
+    webhook_listen: str = "127.0.0.1"
+    webhook_port: int = 8443
+    webhook_path: str = "telegram"
+    webhook_secret: str | None = None
+    persistence_interval: float = 10
+    rate_limit_global: float = 30
+    rate_limit_chat: float = 1
 
 
 load_dotenv()
@@ -17,4 +43,43 @@ def get_settings() -> Settings:
     if not token:
         raise ValueError("TELEGRAM_TOKEN is not set")
     db_path = Path(os.getenv("DATABASE_PATH", "db.sqlite3"))
-    return Settings(token=token, database_path=db_path)
+    shard_dir = os.getenv("SHARD_DIR")
+    backup_dir = os.getenv("BACKUP_DIR")
+    metrics_port = os.getenv("METRICS_PORT")
+    metrics_file = os.getenv("METRICS_FILE")
+    webhook_url = os.getenv("WEBHOOK_URL") or None
+    webhook_secret = os.getenv("WEBHOOK_SECRET") or None
+    if webhook_url and not webhook_secret:
+        raise ValueError("WEBHOOK_SECRET is required with WEBHOOK_URL")
+    return Settings(
+        token=token,
+        database_path=db_path,
+        storage_backend=os.getenv("STORAGE_BACKEND", "sqlite"),
+        shard_dir=Path(shard_dir) if shard_dir else None,
+        backup_dir=Path(backup_dir) if backup_dir else None,
+        backup_interval=int(os.getenv("BACKUP_INTERVAL", "3600")),
+        backup_keep=int(os.getenv("BACKUP_KEEP", "7")),
+        backup_pages=int(os.getenv("BACKUP_PAGES", "256")),
+        backup_sleep=float(os.getenv("BACKUP_SLEEP", "0.05")),
+        snapshot_rebuild_interval=int(os.getenv("SNAPSHOT_REBUILD_INTERVAL", "86400")),
+        write_batch_latency=float(os.getenv("WRITE_BATCH_LATENCY", "0.01")),
+        write_batch_size=int(os.getenv("WRITE_BATCH_SIZE", "200")),
+        sql_trace=os.getenv("SQL_TRACE", "").lower() in ("1", "true", "yes"),
+        sql_repeat_threshold=int(os.getenv("SQL_REPEAT_THRESHOLD", "20")),
+        metrics_port=int(metrics_port) if metrics_port else None,
+        metrics_file=Path(metrics_file) if metrics_file else None,
+        metrics_interval=int(os.getenv("METRICS_INTERVAL", "60")),
+        admin_ids=frozenset(
+            int(part) for part in os.getenv("ADMIN_IDS", "").split(",") if part.strip()
+        ),
+        stats_window=int(os.getenv("STATS_WINDOW", "15")),
+        max_concurrent_updates=int(os.getenv("MAX_CONCURRENT_UPDATES", "16")),
+        webhook_url=webhook_url,
+        webhook_listen=os.getenv("WEBHOOK_LISTEN", "127.0.0.1"),
+        webhook_port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        webhook_path=os.getenv("WEBHOOK_PATH", "telegram").strip("/"),
+        webhook_secret=webhook_secret,
+        persistence_interval=float(os.getenv("PERSISTENCE_INTERVAL", "10")),
+        rate_limit_global=float(os.getenv("RATE_LIMIT_GLOBAL", "30")),
+        rate_limit_chat=float(os.getenv("RATE_LIMIT_CHAT", "1")),
+    )
@@ -6,6 +6,9 @@ ACCOUNT_TYPES = [
     "capital",
 ]
 
+# Account types whose value is the negated debit balance
+NEGATIVE_TYPES = {"liabilities", "income", "capital"}
+
 # Short codes for account types used in transaction descriptions
 ACCOUNT_TYPE_CODES = {
     "assets": "A",
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 from io import BytesIO
 
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 import matplotlib.pyplot as plt
 
 from .init_data import seed
+from .money import format_amount, to_float
 from .states import (
     DASH_MENU,
     DASH_ACC_TYPE,
@@ -15,35 +16,36 @@ from .states import (
     DASH_GROUP_SELECT,
     DASH_GROUP_MENU,
 )
-from .ui import items_reply_keyboard
+from .ui import items_reply_keyboard, reply_keyboard
 from .transactions.helpers import make_labels, labels_map
 
+DASHBOARD_MENU_KEYBOARD = reply_keyboard((
+    ("Cash available", "Accounts"),
+    ("Forecast", "Back"),
+))
+DASHBOARD_ACCOUNT_MENU_KEYBOARD = reply_keyboard((
+    ("Account groups", "Structure"),
+    ("Dynamics", "Back"),
+    ("Cancel",),
+))
+DASHBOARD_GROUP_MENU_KEYBOARD = reply_keyboard((
+    ("Accounts", "Structure"),
+    ("Dynamics", "Back"),
+    ("Cancel",),
+))
+
 
 class DashboardMixin:
     """Dashboard views and charts."""
 
     def dashboard_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [KeyboardButton("Cash available"), KeyboardButton("Accounts")],
-            [KeyboardButton("Forecast"), KeyboardButton("Back")],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return DASHBOARD_MENU_KEYBOARD
 
     def dashboard_account_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [KeyboardButton("Account groups"), KeyboardButton("Structure")],
-            [KeyboardButton("Dynamics"), KeyboardButton("Back")],
-            [KeyboardButton("Cancel")],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return DASHBOARD_ACCOUNT_MENU_KEYBOARD
 
     def dashboard_group_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [KeyboardButton("Accounts"), KeyboardButton("Structure")],
-            [KeyboardButton("Dynamics"), KeyboardButton("Back")],
-            [KeyboardButton("Cancel")],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return DASHBOARD_GROUP_MENU_KEYBOARD
 
     async def start_dashboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text(
@@ -64,7 +66,7 @@ class DashboardMixin:
             account_ids = [int(v) for v in val.split(",") if v]
             total = self.db.accounts_balance(user_id, account_ids)
             await update.message.reply_text(
-                f"Finance available: {total}", reply_markup=self.dashboard_menu_keyboard()
+                f"Finance available: {format_amount(total)}", reply_markup=self.dashboard_menu_keyboard()
             )
             return DASH_MENU
         if text == "Accounts":
@@ -154,42 +156,33 @@ class DashboardMixin:
                     "No data to display", reply_markup=self.dashboard_account_menu_keyboard()
                 )
                 return DASH_ACC_MENU
-            plt.figure()
-            plt.pie(values, labels=names, autopct="%1.1f%%")
-            buf = BytesIO()
-            plt.savefig(buf, format="png")
-            plt.close()
-            buf.seek(0)
+            with self.metrics.chart("type_structure"):
+                plt.figure()
+                plt.pie(values, labels=names, autopct="%1.1f%%")
+                buf = BytesIO()
+                plt.savefig(buf, format="png")
+                plt.close()
+                buf.seek(0)
             await update.message.reply_photo(photo=buf, reply_markup=self.dashboard_account_menu_keyboard())
             return DASH_ACC_MENU
         if text == "Dynamics":
-            rows = self.db.account_type_transactions(user_id, type_id)
-            if not rows:
+            points = self.db.account_type_dynamics(user_id, type_id)
+            if not points:
                 await update.message.reply_text(
                     "No data to display", reply_markup=self.dashboard_account_menu_keyboard()
                 )
                 return DASH_ACC_MENU
-            neg_types = {"liabilities", "income", "capital"}
-            times = []
-            values = []
-            val = 0.0
-            for r in rows:
-                delta = 0.0
-                if r["from_type_id"] == type_id:
-                    delta += r["amount"] if r["from_type"] in neg_types else -r["amount"]
-                if r["to_type_id"] == type_id:
-                    delta += -r["amount"] if r["to_type"] in neg_types else r["amount"]
-                val += delta
-                times.append(datetime.fromisoformat(r["ts"]))
-                values.append(val)
-            plt.figure()
-            plt.plot(times, values)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            buf = BytesIO()
-            plt.savefig(buf, format="png")
-            plt.close()
-            buf.seek(0)
+            times = [datetime.fromtimestamp(day, timezone.utc) for day, _ in points]
+            values = [to_float(value) for _, value in points]
+            with self.metrics.chart("type_dynamics"):
+                plt.figure()
+                plt.plot(times, values)
+                plt.xticks(rotation=45)
+                plt.tight_layout()
+                buf = BytesIO()
+                plt.savefig(buf, format="png")
+                plt.close()
+                buf.seek(0)
             await update.message.reply_photo(photo=buf, reply_markup=self.dashboard_account_menu_keyboard())
             return DASH_ACC_MENU
         await update.message.reply_text(
@@ -250,7 +243,7 @@ class DashboardMixin:
                     "No accounts to display", reply_markup=self.dashboard_group_menu_keyboard()
                 )
                 return DASH_GROUP_MENU
-            lines = [f"{a['name']}: {a['value']}" for a in accounts]
+            lines = [f"{a['name']}: {format_amount(a['value'])}" for a in accounts]
             await update.message.reply_text(
                 "\n".join(lines), reply_markup=self.dashboard_group_menu_keyboard()
             )
@@ -269,42 +262,33 @@ class DashboardMixin:
                     "No data to display", reply_markup=self.dashboard_group_menu_keyboard()
                 )
                 return DASH_GROUP_MENU
-            plt.figure()
-            plt.pie(values, labels=names, autopct="%1.1f%%")
-            buf = BytesIO()
-            plt.savefig(buf, format="png")
-            plt.close()
-            buf.seek(0)
+            with self.metrics.chart("group_structure"):
+                plt.figure()
+                plt.pie(values, labels=names, autopct="%1.1f%%")
+                buf = BytesIO()
+                plt.savefig(buf, format="png")
+                plt.close()
+                buf.seek(0)
             await update.message.reply_photo(photo=buf, reply_markup=self.dashboard_group_menu_keyboard())
             return DASH_GROUP_MENU
         if text == "Dynamics":
-            rows = self.db.account_group_transactions(user_id, gid)
-            if not rows:
+            points = self.db.account_group_dynamics(user_id, gid)
+            if not points:
                 await update.message.reply_text(
                     "No data to display", reply_markup=self.dashboard_group_menu_keyboard()
                 )
                 return DASH_GROUP_MENU
-            neg_types = {"liabilities", "income", "capital"}
-            times = []
-            values = []
-            val = 0.0
-            for r in rows:
-                delta = 0.0
-                if r["from_group_id"] == gid:
-                    delta += r["amount"] if r["from_type"] in neg_types else -r["amount"]
-                if r["to_group_id"] == gid:
-                    delta += -r["amount"] if r["to_type"] in neg_types else r["amount"]
-                val += delta
-                times.append(datetime.fromisoformat(r["ts"]))
-                values.append(val)
-            plt.figure()
-            plt.plot(times, values)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            buf = BytesIO()
-            plt.savefig(buf, format="png")
-            plt.close()
-            buf.seek(0)
+            times = [datetime.fromtimestamp(day, timezone.utc) for day, _ in points]
+            values = [to_float(value) for _, value in points]
+            with self.metrics.chart("group_dynamics"):
+                plt.figure()
+                plt.plot(times, values)
+                plt.xticks(rotation=45)
+                plt.tight_layout()
+                buf = BytesIO()
+                plt.savefig(buf, format="png")
+                plt.close()
+                buf.seek(0)
             await update.message.reply_photo(photo=buf, reply_markup=self.dashboard_group_menu_keyboard())
             return DASH_GROUP_MENU
         await update.message.reply_text(
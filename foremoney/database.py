@@ -1,11 +1,24 @@
 import sqlite3
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Any, Iterable, Sequence, Tuple
 import secrets
 import csv
 from io import StringIO, BytesIO
+from time import perf_counter
 from zipfile import ZipFile, ZIP_DEFLATED
 
+from .name_index import NameIndex
+from .pair_index import PairIndex
+from .directory import AccountDirectory
+from .storage import Storage
+from .tracing import QueryTracer
+from .money import SCALE, to_float
+from .timestamps import (
+    DAY, day_end, day_start, day_start_text, epoch_day, now_text, to_epoch,
+)
+
 
 SCHEMA = [
     """
@@ -40,7 +53,13 @@ SCHEMA = [
         from_account INTEGER NOT NULL REFERENCES accounts(id),
         to_account INTEGER NOT NULL REFERENCES accounts(id),
         amount REAL NOT NULL,
-        ts DATETIME DEFAULT CURRENT_TIMESTAMP
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+        from_group_id INTEGER,
+        to_group_id INTEGER,
+        from_type_id INTEGER,
+        to_type_id INTEGER,
+        ts_epoch INTEGER,
+        amount_minor INTEGER
     );
     """,
     """
@@ -63,42 +82,378 @@ SCHEMA = [
         family_id INTEGER NOT NULL
     );
     """,
+    # transactions moved out of the open period by close_period()
+    """
+    CREATE TABLE IF NOT EXISTS transactions_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        from_account INTEGER NOT NULL,
+        to_account INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        ts DATETIME,
+        from_group_id INTEGER,
+        to_group_id INTEGER,
+        from_type_id INTEGER,
+        to_type_id INTEGER,
+        ts_epoch INTEGER,
+        amount_minor INTEGER
+    );
+    """,
+    # closing balance of an account at the end of every day it was touched
+    """
+    CREATE TABLE IF NOT EXISTS daily_balances (
+        user_id INTEGER NOT NULL,
+        account_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        PRIMARY KEY (account_id, day)
+    ) WITHOUT ROWID;
+    """,
+]
+
+# Columns added after the first release: (table, column, declaration)
+COLUMNS = [
+    ("account_groups", "archived", "INTEGER DEFAULT 0"),
+    ("transactions", "from_group_id", "INTEGER"),
+    ("transactions", "to_group_id", "INTEGER"),
+    ("transactions", "from_type_id", "INTEGER"),
+    ("transactions", "to_type_id", "INTEGER"),
+    ("transactions", "ts_epoch", "INTEGER"),
+    ("transactions", "amount_minor", "INTEGER"),
+]
+
+# Idempotent data migrations run on every start
+BACKFILL = [
+    """
+    UPDATE transactions SET
+        from_group_id=(SELECT group_id FROM accounts WHERE id=transactions.from_account),
+        to_group_id=(SELECT group_id FROM accounts WHERE id=transactions.to_account)
+    WHERE from_group_id IS NULL OR to_group_id IS NULL
+    """,
+    """
+    UPDATE transactions SET
+        from_type_id=(SELECT type_id FROM account_groups WHERE id=transactions.from_group_id),
+        to_type_id=(SELECT type_id FROM account_groups WHERE id=transactions.to_group_id)
+    WHERE from_type_id IS NULL OR to_type_id IS NULL
+    """,
+    """
+    UPDATE transactions SET ts_epoch=CAST(strftime('%s', ts) AS INTEGER)
+    WHERE ts_epoch IS NULL
+    """,
+    f"""
+    UPDATE transactions SET amount_minor=CAST(ROUND(amount * {SCALE}) AS INTEGER)
+    WHERE amount_minor IS NULL
+    """,
+]
+
+# Transaction columns resolved to names through AccountDirectory
+TX_COLUMNS = """
+    t.id, t.amount_minor AS amount, t.ts, t.from_account, t.to_account,
+    t.from_group_id, t.to_group_id, t.from_type_id, t.to_type_id
+"""
+
+# Recompute daily_balances from transactions; {where} limits it to a family
+SNAPSHOT_REBUILD = f"""
+    INSERT INTO daily_balances (user_id, account_id, day, balance)
+    SELECT user_id, account_id, day,
+           SUM(delta) OVER (PARTITION BY account_id ORDER BY day)
+    FROM (
+        SELECT user_id, account_id, day, SUM(delta) AS delta
+        FROM (
+            SELECT user_id, to_account AS account_id,
+                   ts_epoch - ts_epoch % {DAY} AS day, amount_minor AS delta
+            FROM transactions {{where}}
+            UNION ALL
+            SELECT user_id, from_account AS account_id,
+                   ts_epoch - ts_epoch % {DAY} AS day, -amount_minor AS delta
+            FROM transactions {{where}}
+        )
+        GROUP BY user_id, account_id, day
+    )
+"""
+
+# Columns copied from transactions into transactions_archive
+ARCHIVE_COLUMNS = """
+    id, user_id, from_account, to_account, amount, ts, from_group_id,
+    to_group_id, from_type_id, to_type_id, ts_epoch, amount_minor
+"""
+
+# Balance of every account over the transactions before a moment
+CLOSING_BALANCES = """
+    SELECT account_id, SUM(delta) AS balance
+    FROM (
+        SELECT to_account AS account_id, amount_minor AS delta
+        FROM transactions WHERE user_id=? AND ts_epoch<?
+        UNION ALL
+        SELECT from_account AS account_id, -amount_minor AS delta
+        FROM transactions WHERE user_id=? AND ts_epoch<?
+    )
+    GROUP BY account_id
+    HAVING SUM(delta) != 0
+    ORDER BY account_id
+"""
+
+# Accounts (selected by user_id and key) and the transaction columns of an
+# "account", "group" or "type" balance
+BALANCE_SCOPES = {
+    "account": (
+        "SELECT id FROM accounts WHERE user_id=? AND id=?",
+        "from_account", "to_account",
+    ),
+    "group": (
+        "SELECT id FROM accounts WHERE user_id=? AND group_id=?",
+        "from_group_id", "to_group_id",
+    ),
+    "type": (
+        """
+        SELECT a.id FROM accounts a JOIN account_groups g ON g.id=a.group_id
+        WHERE g.user_id=? AND g.type_id=?
+        """,
+        "from_type_id", "to_type_id",
+    ),
+}
+
+# Most recent transactions PairIndex is built from
+PAIR_HISTORY = 1000
+
+# Transaction columns needed to undo a posting in snapshots and PairIndex
+POSTING_COLUMNS = "from_account, to_account, amount_minor AS amount, ts_epoch"
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_tx_from_account ON transactions(user_id, from_account)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_to_account ON transactions(user_id, to_account)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_from_group ON transactions(user_id, from_group_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_to_group ON transactions(user_id, to_group_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_from_type ON transactions(user_id, from_type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_to_type ON transactions(user_id, to_type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_ts ON transactions(user_id, ts_epoch)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_from_account_ts ON transactions(from_account, ts_epoch)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_to_account_ts ON transactions(to_account, ts_epoch)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_archive_ts ON transactions_archive(user_id, ts_epoch)",
 ]
 
 
-class Database:
-    def __init__(self, path: Path) -> None:
+class Database(Storage):
+    """SQLite implementation of :class:`Storage`."""
+
+    def __init__(self, path: Path, tracer: QueryTracer | None = None) -> None:
         self.path = path
+        self.tracer = tracer
+        self.cache_hits: Counter[str] = Counter()
+        self.cache_misses: Counter[str] = Counter()
+        self.connect()
+
+    def connect(self) -> None:
         self.conn = sqlite3.connect(self.path)
         self.conn.row_factory = sqlite3.Row
+        if self.tracer is not None:
+            self.conn.set_trace_callback(self.tracer.on_statement)
+        # readers see a stable snapshot while the writer keeps committing
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._readers: list[sqlite3.Connection] = []
+        self._directories: dict[int, AccountDirectory] = {}
+        self._pair_indexes: dict[int, PairIndex] = {}
+        self._batch_depth = 0
+        self.row_counts: dict[str, int] | None = None
         self._initialize()
 
+    def close(self) -> None:
+        while self._readers:
+            self._readers.pop().close()
+        self.conn.close()
+
+    def _unlink(self) -> None:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    @contextmanager
+    def snapshot(self):
+        """Yield a read-only connection holding one consistent snapshot.
+
+        Readers are pooled and may be used from worker threads, so long
+        exports and reports neither block nor observe concurrent writes.
+        """
+        try:
+            conn = self._readers.pop()
+        except IndexError:
+            conn = sqlite3.connect(
+                f"{Path(self.path).resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            if self.tracer is not None:
+                conn.set_trace_callback(self.tracer.on_statement)
+        try:
+            conn.execute("BEGIN")
+            # the snapshot is taken by the first read of the transaction
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+            yield conn
+        finally:
+            conn.rollback()
+            self._readers.append(conn)
+
     def _initialize(self) -> None:
         cur = self.conn.cursor()
         for stmt in SCHEMA:
             cur.execute(stmt)
         self.conn.commit()
-        # ensure archived column exists for account_groups in old databases
-        info = cur.execute("PRAGMA table_info(account_groups)").fetchall()
-        if not any(row[1] == "archived" for row in info):
-            cur.execute("ALTER TABLE account_groups ADD COLUMN archived INTEGER DEFAULT 0")
-            self.conn.commit()
+        # add columns missing in databases created by older versions
+        for table, column, decl in COLUMNS:
+            info = cur.execute(f"PRAGMA table_info({table})").fetchall()
+            if not any(row[1] == column for row in info):
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        for stmt in BACKFILL + INDEXES:
+            cur.execute(stmt)
+        self.conn.commit()
+        if (
+            cur.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()
+            and not cur.execute("SELECT 1 FROM daily_balances LIMIT 1").fetchone()
+        ):
+            self.rebuild_balance_snapshots()
+        cur.execute("PRAGMA optimize")
+        self.row_counts = self._count_rows(self.conn)
 
     def execute(self, query: str, params: Iterable = ()):  # simple wrapper
+        start = perf_counter()
         cur = self.conn.execute(query, params)
-        self.conn.commit()
+        if not self._batch_depth:
+            self.conn.commit()
+        if self.tracer is not None:
+            self.tracer.add_time(perf_counter() - start)
         return cur
 
+    def _drop_caches(self) -> None:
+        # cached directories, indexes and row counts may include rolled back writes
+        self._directories.clear()
+        self._pair_indexes.clear()
+        self.row_counts = None
+
+    @staticmethod
+    def _count_rows(conn: sqlite3.Connection) -> dict[str, int]:
+        tables = [
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )
+        ]
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in tables
+        }
+
+    def _rows_changed(self, table: str, count: int) -> None:
+        """Adjust the row counter of ``table`` after an insert or delete."""
+        if self.row_counts is not None:
+            self.row_counts[table] = self.row_counts.get(table, 0) + count
+
+    @contextmanager
+    def batch(self):
+        """Apply all writes of the block in one SQLite transaction.
+
+        Commits are deferred to the end of the block, so a burst of writes
+        pays for a single fsync.
+        """
+        if self._batch_depth == 0 and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._batch_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.rollback()
+                self._drop_caches()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            try:
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                self._drop_caches()
+                raise
+
+    @contextmanager
+    def atomic(self):
+        """Make the writes of the block all-or-nothing.
+
+        Outside :meth:`batch` this is a plain transaction. Inside a batch it
+        is a savepoint, so a failing write does not undo the others.
+        """
+        if not self._batch_depth:
+            try:
+                with self.conn:
+                    yield
+            except BaseException:
+                self._drop_caches()
+                raise
+            return
+        self.conn.execute("SAVEPOINT atomic")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK TO atomic")
+            self.conn.execute("RELEASE atomic")
+            self._drop_caches()
+            raise
+        self.conn.execute("RELEASE atomic")
+
     def fetchall(self, query: str, params: Iterable = ()) -> Iterable[sqlite3.Row]:
-        cur = self.conn.execute(query, params)
-        return cur.fetchall()
+        start = perf_counter()
+        rows = self.conn.execute(query, params).fetchall()
+        if self.tracer is not None:
+            self.tracer.add_time(perf_counter() - start)
+        return rows
 
     def fetchone(self, query: str, params: Iterable = ()) -> sqlite3.Row | None:
-        cur = self.conn.execute(query, params)
-        return cur.fetchone()
+        start = perf_counter()
+        row = self.conn.execute(query, params).fetchone()
+        if self.tracer is not None:
+            self.tracer.add_time(perf_counter() - start)
+        return row
+
+    # ---- storage location ----
+
+    def paths(self) -> list[Path]:
+        return [self.path]
+
+    def stats(self) -> dict[str, Any]:
+        stats = super().stats()
+        row_counts = self.row_counts
+        if row_counts is None:
+            # counted again only after a rollback made the counters unreliable
+            with self.snapshot() as conn:
+                row_counts = self.row_counts = self._count_rows(conn)
+        stats["rows"] = dict(row_counts)
+        stats["caches"] = {
+            name: (self.cache_hits[name], self.cache_misses[name])
+            for name in ("directory", "pair_index")
+        }
+        return stats
+
+    def recreate(self, user_id: int) -> None:
+        self.close()
+        self._unlink()
+        self.connect()
+
+    def export_data(self, user_id: int) -> bytes:
+        """Return the archive of a snapshot; safe to call from a worker thread."""
+        with self.snapshot() as conn:
+            return dump_archive(conn)
+
+    def import_data(self, user_id: int, data: bytes) -> None:
+        self.close()
+        self._unlink()
+        import_archive(self.path, data)
+        self.connect()
 
     # ---- high level helpers ----
 
+    def family_ids(self) -> list[int]:
+        rows = self.fetchall("SELECT DISTINCT user_id FROM accounts ORDER BY user_id")
+        return [row["user_id"] for row in rows]
+
     def family_id(self, user_id: int) -> int:
         row = self.fetchone(
             "SELECT family_id FROM user_family WHERE user_id=?",
@@ -112,6 +467,7 @@ class Database:
             "INSERT INTO family_invites (token, family_id) VALUES (?, ?)",
             (token, family_id),
         )
+        self._rows_changed("family_invites", 1)
         return token
 
     def use_family_invite(self, token: str, user_id: int) -> bool:
@@ -122,16 +478,30 @@ class Database:
         if not row:
             return False
         family_id = row["family_id"]
-        self.execute("DELETE FROM family_invites WHERE token=?", (token,))
-        self.execute(
-            "INSERT OR REPLACE INTO user_family (user_id, family_id) VALUES (?, ?)",
-            (user_id, family_id),
+        cur = self.execute("DELETE FROM family_invites WHERE token=?", (token,))
+        self._rows_changed("family_invites", -cur.rowcount)
+        cur = self.execute(
+            "UPDATE user_family SET family_id=? WHERE user_id=?", (family_id, user_id)
         )
+        if not cur.rowcount:
+            self.execute(
+                "INSERT INTO user_family (user_id, family_id) VALUES (?, ?)",
+                (user_id, family_id),
+            )
+            self._rows_changed("user_family", 1)
         return True
 
     def account_types(self) -> Iterable[sqlite3.Row]:
         return self.fetchall("SELECT id, name FROM account_types ORDER BY name")
 
+    def add_account_type(self, name: str) -> None:
+        cur = self.execute("INSERT OR IGNORE INTO account_types (name) VALUES (?)", (name,))
+        self._rows_changed("account_types", cur.rowcount)
+
+    def account_type_id(self, name: str) -> int | None:
+        row = self.fetchone("SELECT id FROM account_types WHERE name=?", (name,))
+        return row["id"] if row else None
+
     def account_groups(self, user_id: int, type_id: int) -> Iterable[sqlite3.Row]:
         user_id = self.family_id(user_id)
         return self.fetchall(
@@ -150,12 +520,69 @@ class Database:
             (user_id, group_id),
         )
 
+    def find_account_group(self, user_id: int, type_id: int, name: str) -> int | None:
+        user_id = self.family_id(user_id)
+        row = self.fetchone(
+            "SELECT id FROM account_groups WHERE user_id=? AND type_id=? AND name=?",
+            (user_id, type_id, name),
+        )
+        return row["id"] if row else None
+
+    def find_account(self, user_id: int, group_id: int, name: str) -> int | None:
+        user_id = self.family_id(user_id)
+        row = self.fetchone(
+            "SELECT id FROM accounts WHERE user_id=? AND group_id=? AND name=? ORDER BY id LIMIT 1",
+            (user_id, group_id, name),
+        )
+        return row["id"] if row else None
+
+    def directory(self, user_id: int) -> AccountDirectory:
+        """Return the cached names and placement of the family's accounts."""
+        family_id = self.family_id(user_id)
+        directory = self._directories.get(family_id)
+        if directory is None:
+            self.cache_misses["directory"] += 1
+            directory = self._directories[family_id] = AccountDirectory(
+                self.fetchall(
+                    "SELECT id, name, group_id, archived FROM accounts WHERE user_id=?",
+                    (family_id,),
+                ),
+                self.fetchall(
+                    "SELECT id, name, type_id FROM account_groups WHERE user_id=?",
+                    (family_id,),
+                ),
+                self.fetchall("SELECT id, name FROM account_types"),
+            )
+        else:
+            self.cache_hits["directory"] += 1
+        return directory
+
+    def account_type_names(self, user_id: int) -> list[dict]:
+        return self.directory(user_id).children("type")
+
+    def account_group_names(self, user_id: int, type_id: int) -> list[dict]:
+        return self.directory(user_id).children("group", type_id)
+
+    def account_names(self, user_id: int, group_id: int) -> list[dict]:
+        return self.directory(user_id).children("account", group_id)
+
+    def name_index(self, user_id: int) -> NameIndex:
+        return self.directory(user_id).name_index()
+
+    def _invalidate_directory(self, user_id: int) -> None:
+        self._directories.pop(self.family_id(user_id), None)
+
+    def account_type_name(self, user_id: int, account_id: int) -> str | None:
+        return self.directory(user_id).account_type_name(account_id)
+
     def add_account(self, user_id: int, group_id: int, name: str) -> int:
         user_id = self.family_id(user_id)
         cur = self.execute(
             "INSERT INTO accounts (user_id, group_id, name) VALUES (?, ?, ?)",
             (user_id, group_id, name),
         )
+        self._rows_changed("accounts", 1)
+        self._invalidate_directory(user_id)
         return cur.lastrowid
 
     def add_transaction(
@@ -163,26 +590,53 @@ class Database:
         user_id: int,
         from_id: int,
         to_id: int,
-        amount: float,
+        amount: int,
         ts: str | None = None,
     ) -> int:
         user_id = self.family_id(user_id)
-        if ts is not None:
-            cur = self.execute(
-                """
-                INSERT INTO transactions (user_id, from_account, to_account, amount, ts)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user_id, from_id, to_id, amount, ts),
-            )
-        else:
-            cur = self.execute(
-                """
-                INSERT INTO transactions (user_id, from_account, to_account, amount)
-                VALUES (?, ?, ?, ?)
-                """,
-                (user_id, from_id, to_id, amount),
+        if ts is None:
+            ts = now_text()
+        with self.atomic():
+            return self._insert_transaction(user_id, from_id, to_id, amount, ts)
+
+    def add_transactions(self, user_id: int, rows: Iterable[Sequence]) -> list[int]:
+        """Insert all rows in one SQLite transaction (a savepoint in a batch)."""
+        user_id = self.family_id(user_id)
+        with self.atomic():
+            return [
+                self._insert_transaction(user_id, from_id, to_id, amount, ts or now_text())
+                for from_id, to_id, amount, ts in rows
+            ]
+
+    def _insert_transaction(
+        self, user_id: int, from_id: int, to_id: int, amount: int, ts: str
+    ) -> int:
+        """Insert a transaction inside the caller's SQLite transaction."""
+        directory = self.directory(user_id)
+        if directory.placement(from_id) is None or directory.placement(to_id) is None:
+            self._invalidate_directory(user_id)
+            directory = self.directory(user_id)
+        from_group, from_type = directory.placement(from_id) or (None, None)
+        to_group, to_type = directory.placement(to_id) or (None, None)
+        epoch = to_epoch(ts)
+        cur = self.conn.execute(
+            """
+            INSERT INTO transactions (
+                user_id, from_account, to_account, amount, amount_minor,
+                ts, ts_epoch,
+                from_group_id, to_group_id, from_type_id, to_type_id
             )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                user_id, from_id, to_id, to_float(amount), amount, ts, epoch,
+                from_group, to_group, from_type, to_type,
+            ),
+        )
+        self._rows_changed("transactions", 1)
+        self._shift_snapshots(user_id, from_id, to_id, epoch, amount)
+        posting = {"from_account": from_id, "to_account": to_id, "ts_epoch": epoch}
+        self._post_pair(user_id, posting, 1)
         return cur.lastrowid
 
     def transactions(
@@ -194,74 +648,199 @@ class Database:
     ) -> Iterable[sqlite3.Row]:
         """Return transactions list applying optional filters."""
         user_id = self.family_id(user_id)
-        query = """
-            SELECT t.id, t.amount, t.ts,
-                   fa.name AS from_name, ta.name AS to_name,
-                   fg.name AS from_group, tg.name AS to_group,
-                   ft.name AS from_type, tt.name AS to_type
-            FROM transactions t
-            JOIN accounts fa ON fa.id=t.from_account
-            JOIN account_groups fg ON fa.group_id=fg.id
-            JOIN account_types ft ON fg.type_id=ft.id
-            JOIN accounts ta ON ta.id=t.to_account
-            JOIN account_groups tg ON ta.group_id=tg.id
-            JOIN account_types tt ON tg.type_id=tt.id
+        table = "transactions_archive" if filters and filters.get("archived") else "transactions"
+        query = f"""
+            SELECT {TX_COLUMNS}
+            FROM {table} t
             WHERE t.user_id=?
         """
         params: list = [user_id]
         if filters:
             if filters.get("min_date"):
-                query += " AND date(t.ts) >= date(?)"
-                params.append(filters["min_date"])
+                query += " AND t.ts_epoch >= ?"
+                params.append(day_start(filters["min_date"]))
             if filters.get("max_date"):
-                query += " AND date(t.ts) <= date(?)"
-                params.append(filters["max_date"])
+                query += " AND t.ts_epoch < ?"
+                params.append(day_end(filters["max_date"]))
             if filters.get("min_amount") is not None:
-                query += " AND t.amount >= ?"
+                query += " AND t.amount_minor >= ?"
                 params.append(filters["min_amount"])
             if filters.get("max_amount") is not None:
-                query += " AND t.amount <= ?"
+                query += " AND t.amount_minor <= ?"
                 params.append(filters["max_amount"])
             if filters.get("group_id"):
-                query += " AND (fg.id=? OR tg.id=?)"
+                query += " AND (t.from_group_id=? OR t.to_group_id=?)"
                 params.extend([filters["group_id"], filters["group_id"]])
             if filters.get("account_id"):
-                query += " AND (fa.id=? OR ta.id=?)"
+                query += " AND (t.from_account=? OR t.to_account=?)"
                 params.extend([filters["account_id"], filters["account_id"]])
         query += " ORDER BY t.id DESC LIMIT ? OFFSET ?"
         params.extend([limit, offset])
-        return self.fetchall(query, params)
+        directory = self.directory(user_id)
+        return [directory.describe(r) for r in self.fetchall(query, params)]
 
-    def transaction(self, user_id: int, tx_id: int) -> sqlite3.Row | None:
+    def transaction(self, user_id: int, tx_id: int, archived: bool = False) -> dict | None:
         user_id = self.family_id(user_id)
+        table = "transactions_archive" if archived else "transactions"
+        row = self.fetchone(
+            f"SELECT {TX_COLUMNS} FROM {table} t WHERE t.user_id=? AND t.id=?",
+            (user_id, tx_id),
+        )
+        return self.directory(user_id).describe(row) if row else None
+
+    def _tx_posting(self, user_id: int, tx_id: int) -> sqlite3.Row | None:
         return self.fetchone(
-            """
-            SELECT t.id, t.amount, t.ts,
-                   fa.name AS from_name, ta.name AS to_name,
-                   fg.name AS from_group, tg.name AS to_group,
-                   ft.name AS from_type, tt.name AS to_type
-            FROM transactions t
-            JOIN accounts fa ON fa.id=t.from_account
-            JOIN account_groups fg ON fa.group_id=fg.id
-            JOIN account_types ft ON fg.type_id=ft.id
-            JOIN accounts ta ON ta.id=t.to_account
-            JOIN account_groups tg ON ta.group_id=tg.id
-            JOIN account_types tt ON tg.type_id=tt.id
-            WHERE t.user_id=? AND t.id=?
-            """,
+            f"SELECT {POSTING_COLUMNS} FROM transactions WHERE user_id=? AND id=?",
             (user_id, tx_id),
         )
 
     def delete_transaction(self, user_id: int, tx_id: int) -> None:
         user_id = self.family_id(user_id)
-        self.execute("DELETE FROM transactions WHERE user_id=? AND id=?", (user_id, tx_id))
+        row = self._tx_posting(user_id, tx_id)
+        if not row:
+            return
+        with self.atomic():
+            self.conn.execute("DELETE FROM transactions WHERE user_id=? AND id=?", (user_id, tx_id))
+            self._rows_changed("transactions", -1)
+            self._shift_snapshots(
+                user_id, row["from_account"], row["to_account"],
+                row["ts_epoch"], -row["amount"],
+            )
+        self._post_pair(user_id, row, -1)
 
-    def update_transaction_amount(self, user_id: int, tx_id: int, amount: float) -> None:
+    def update_transaction_amount(self, user_id: int, tx_id: int, amount: int) -> None:
         user_id = self.family_id(user_id)
-        self.execute(
-            "UPDATE transactions SET amount=? WHERE user_id=? AND id=?",
-            (amount, user_id, tx_id),
-        )
+        row = self._tx_posting(user_id, tx_id)
+        if not row:
+            return
+        with self.atomic():
+            self.conn.execute(
+                "UPDATE transactions SET amount=?, amount_minor=? WHERE user_id=? AND id=?",
+                (to_float(amount), amount, user_id, tx_id),
+            )
+            self._shift_snapshots(
+                user_id, row["from_account"], row["to_account"],
+                row["ts_epoch"], amount - row["amount"],
+            )
+
+    def close_period(self, user_id: int, before: str) -> int:
+        user_id = self.family_id(user_id)
+        epoch = day_start(before)
+        ts = day_start_text(before)
+        corr = self.correction_account(user_id)
+        with self.atomic():
+            balances = self.conn.execute(
+                CLOSING_BALANCES, (user_id, epoch, user_id, epoch)
+            ).fetchall()
+            moved = self.conn.execute(
+                f"""
+                INSERT INTO transactions_archive ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM transactions WHERE user_id=? AND ts_epoch<?
+                """,
+                (user_id, epoch),
+            ).rowcount
+            self.conn.execute(
+                "DELETE FROM transactions WHERE user_id=? AND ts_epoch<?", (user_id, epoch)
+            )
+            self._rows_changed("transactions_archive", moved)
+            self._rows_changed("transactions", -moved)
+            for row in balances:
+                account_id, balance = row["account_id"], row["balance"]
+                if account_id == corr:
+                    continue
+                if balance > 0:
+                    self._insert_transaction(user_id, corr, account_id, balance, ts)
+                else:
+                    self._insert_transaction(user_id, account_id, corr, -balance, ts)
+            self._rebuild_snapshots(self.conn, "WHERE user_id=?", (user_id,))
+        self._pair_indexes.pop(user_id, None)
+        return moved
+
+    # ---- daily balance snapshots ----
+
+    def _shift_snapshots(
+        self, user_id: int, from_id: int, to_id: int, epoch: int, amount: int
+    ) -> None:
+        """Move ``amount`` between the daily balances of two accounts.
+
+        Runs inside the caller's transaction. The day of ``epoch`` gets a row
+        if it has none, and it and every later day of both accounts are
+        shifted, so back-dated postings keep all closing balances right.
+        """
+        day = epoch_day(epoch)
+        for account_id, delta in ((from_id, -amount), (to_id, amount)):
+            cur = self.conn.execute(
+                """
+                INSERT OR IGNORE INTO daily_balances (user_id, account_id, day, balance)
+                VALUES (?, ?, ?, COALESCE((
+                    SELECT balance FROM daily_balances
+                    WHERE account_id=? AND day<? ORDER BY day DESC LIMIT 1
+                ), 0))
+                """,
+                (user_id, account_id, day, account_id, day),
+            )
+            self._rows_changed("daily_balances", cur.rowcount)
+            self.conn.execute(
+                "UPDATE daily_balances SET balance=balance+? WHERE account_id=? AND day>=?",
+                (delta, account_id, day),
+            )
+
+    def rebuild_balance_snapshots(self, user_id: int | None = None) -> None:
+        """Recompute daily balances of one family or the whole file."""
+        if user_id is None:
+            where, params = "", ()
+        else:
+            user_id = self.family_id(user_id)
+            where, params = "WHERE user_id=?", (user_id,)
+        with self.atomic():
+            self._rebuild_snapshots(self.conn, where, params)
+
+    def rebuild_family_snapshots(self, family_id: int) -> None:
+        """Recompute daily balances of a family on a connection of its own.
+
+        The main connection is not touched, so this may run in a worker
+        thread; SQLite serializes it with the main writer via the file lock.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        if self.tracer is not None:
+            conn.set_trace_callback(self.tracer.on_statement)
+        try:
+            with conn:
+                self._rebuild_snapshots(conn, "WHERE user_id=?", (family_id,))
+        finally:
+            conn.close()
+
+    def _rebuild_snapshots(self, conn: sqlite3.Connection, where: str, params: tuple) -> None:
+        removed = conn.execute(f"DELETE FROM daily_balances {where}", params).rowcount
+        added = conn.execute(SNAPSHOT_REBUILD.format(where=where), params * 2).rowcount
+        self._rows_changed("daily_balances", added - removed)
+
+    # ---- in-memory indexes ----
+
+    def pair_index(self, user_id: int) -> PairIndex:
+        """Return the cached pair frequencies of a family's recent transactions."""
+        user_id = self.family_id(user_id)
+        index = self._pair_indexes.get(user_id)
+        if index is None:
+            self.cache_misses["pair_index"] += 1
+            rows = self.fetchall(
+                """
+                SELECT from_account, to_account, ts_epoch FROM transactions
+                WHERE user_id=? ORDER BY ts_epoch DESC LIMIT ?
+                """,
+                (user_id, PAIR_HISTORY),
+            )
+            # a full window may have left out older rows; they are not counted
+            since = rows[-1]["ts_epoch"] if len(rows) == PAIR_HISTORY else None
+            index = self._pair_indexes[user_id] = PairIndex(reversed(rows), since=since)
+        else:
+            self.cache_hits["pair_index"] += 1
+        return index
+
+    def _post_pair(self, user_id: int, row, count: int) -> None:
+        index = self._pair_indexes.get(user_id)
+        if index is not None:
+            index.post(row, count)
 
     # ----- settings helpers -----
 
@@ -281,6 +860,7 @@ class Database:
                 "INSERT INTO settings (user_id, key, value) VALUES (?, ?, ?)",
                 (user_id, key, value),
             )
+            self._rows_changed("settings", 1)
 
     def get_setting(self, user_id: int, key: str) -> str | None:
         user_id = self.family_id(user_id)
@@ -298,6 +878,8 @@ class Database:
             "INSERT INTO account_groups (user_id, type_id, name) VALUES (?, ?, ?)",
             (user_id, type_id, name),
         )
+        self._rows_changed("account_groups", 1)
+        self._invalidate_directory(user_id)
         return cur.lastrowid
 
     def update_account_group_name(self, user_id: int, group_id: int, name: str) -> None:
@@ -306,6 +888,7 @@ class Database:
             "UPDATE account_groups SET name=? WHERE user_id=? AND id=?",
             (name, user_id, group_id),
         )
+        self._invalidate_directory(user_id)
 
     def archive_account_group(self, user_id: int, group_id: int) -> None:
         user_id = self.family_id(user_id)
@@ -320,6 +903,7 @@ class Database:
             "UPDATE accounts SET name=? WHERE user_id=? AND id=?",
             (name, user_id, account_id),
         )
+        self._invalidate_directory(user_id)
 
     def archive_account(self, user_id: int, account_id: int) -> None:
         user_id = self.family_id(user_id)
@@ -327,6 +911,7 @@ class Database:
             "UPDATE accounts SET archived=1 WHERE user_id=? AND id=?",
             (user_id, account_id),
         )
+        self._invalidate_directory(user_id)
 
     def all_accounts(self, user_id: int, include_archived: bool = False) -> Iterable[sqlite3.Row]:
         user_id = self.family_id(user_id)
@@ -339,208 +924,163 @@ class Database:
         """.format(arch="" if include_archived else "AND a.archived=0")
         return self.fetchall(query, (user_id,))
 
-    def account_balance(self, user_id: int, account_id: int) -> float:
+    def account_balance(self, user_id: int, account_id: int) -> int:
         user_id = self.family_id(user_id)
         inc = self.fetchone(
-            "SELECT COALESCE(SUM(amount),0) AS s FROM transactions WHERE user_id=? AND to_account=?",
+            "SELECT COALESCE(SUM(amount_minor),0) AS s FROM transactions WHERE user_id=? AND to_account=?",
             (user_id, account_id),
         )["s"]
         out = self.fetchone(
-            "SELECT COALESCE(SUM(amount),0) AS s FROM transactions WHERE user_id=? AND from_account=?",
+            "SELECT COALESCE(SUM(amount_minor),0) AS s FROM transactions WHERE user_id=? AND from_account=?",
             (user_id, account_id),
         )["s"]
         return inc - out
 
-    def account_value(self, user_id: int, account_id: int) -> float:
-        """Return account value based on its type."""
-        user_id = self.family_id(user_id)
-        bal = self.account_balance(user_id, account_id)
-        row = self.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM accounts a
-            JOIN account_groups g ON a.group_id=g.id
-            JOIN account_types t ON g.type_id=t.id
-            WHERE a.user_id=? AND a.id=?
-            """,
-            (user_id, account_id),
-        )
-        if row and row["type_name"] in ("liabilities", "income", "capital"):
-            return -bal
-        return bal
+    def account_group_info(self, user_id: int, group_id: int) -> dict | None:
+        return self.directory(user_id).group_info(group_id)
 
-    def accounts_with_value(self, user_id: int, group_id: int):
-        """Return accounts list with calculated values."""
-        user_id = self.family_id(user_id)
-        accs = self.accounts(user_id, group_id)
-        result = []
-        for a in accs:
-            val = self.account_value(user_id, a["id"])
-            result.append({"id": a["id"], "name": a["name"], "value": val})
-        return result
-
-    def account_group_value(self, user_id: int, group_id: int) -> float:
-        """Return total value of all accounts within a group."""
-        user_id = self.family_id(user_id)
-        total = 0.0
-        for acc in self.accounts(user_id, group_id):
-            total += self.account_value(user_id, acc["id"])
-        return total
+    def _snapshot_history(self, user_id: int, scope: str, key: int) -> list[tuple[int, int]]:
+        """Sum the daily balances of the accounts of a ``BALANCE_SCOPES`` entry.
 
-    def account_groups_with_value(self, user_id: int, type_id: int):
-        """Return account groups list with calculated values."""
-        user_id = self.family_id(user_id)
-        groups = self.account_groups(user_id, type_id)
-        result = []
-        for g in groups:
-            val = self.account_group_value(user_id, g["id"])
-            result.append({"id": g["id"], "name": g["name"], "value": val})
-        return result
-
-    def account_type_value(self, user_id: int, type_id: int) -> float:
-        """Return total value of all accounts within a type."""
+        Every snapshot row replaces the previous closing balance of its
+        account in the running total, giving one point per touched day.
+        """
         user_id = self.family_id(user_id)
-        total = 0.0
-        for g in self.account_groups(user_id, type_id):
-            total += self.account_group_value(user_id, g["id"])
-        return total
+        accounts = BALANCE_SCOPES[scope][0]
+        with self.snapshot() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT account_id, day, balance FROM daily_balances
+                WHERE user_id=? AND account_id IN ({accounts})
+                ORDER BY day
+                """,
+                (user_id, user_id, key),
+            ).fetchall()
+        latest: dict[int, int] = {}
+        total = 0
+        points: list[tuple[int, int]] = []
+        for account_id, day, balance in rows:
+            total += balance - latest.get(account_id, 0)
+            latest[account_id] = balance
+            if points and points[-1][0] == day:
+                points[-1] = (day, total)
+            else:
+                points.append((day, total))
+        return points
 
-    def account_types_with_value(self, user_id: int):
-        """Return account types list with calculated values."""
-        user_id = self.family_id(user_id)
-        types = self.account_types()
-        result = []
-        for t in types:
-            val = self.account_type_value(user_id, t["id"])
-            result.append({"id": t["id"], "name": t["name"], "value": val})
-        return result
-
-    def accounts_balance(self, user_id: int, account_ids: Iterable[int]) -> float:
-        user_id = self.family_id(user_id)
-        total = 0.0
-        for aid in account_ids:
-            total += self.account_balance(user_id, aid)
-        return total
+    def account_type_history(self, user_id: int, type_id: int) -> list[tuple[int, int]]:
+        return self._snapshot_history(user_id, "type", type_id)
 
-    def correction_account(self, user_id: int) -> int:
-        user_id = self.family_id(user_id)
-        row = self.fetchone(
-            """
-            SELECT a.id FROM accounts a
-            JOIN account_groups g ON a.group_id=g.id
-            JOIN account_types t ON g.type_id=t.id
-            WHERE a.user_id=? AND t.name='capital' AND g.name='Corrections' AND a.archived=0
-            ORDER BY a.id LIMIT 1
-            """,
-            (user_id,),
-        )
-        if row:
-            return row["id"]
-        group = self.fetchone(
-            """
-            SELECT g.id FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.user_id=? AND t.name='capital' AND g.name='Corrections'
-            """,
-            (user_id,),
-        )
-        if not group:
-            type_row = self.fetchone("SELECT id FROM account_types WHERE name='capital'")
-            gid = self.add_account_group(user_id, type_row["id"], "Corrections")
-        else:
-            gid = group["id"]
-        return self.add_account(user_id, gid, "Default")
+    def account_group_history(self, user_id: int, group_id: int) -> list[tuple[int, int]]:
+        return self._snapshot_history(user_id, "group", group_id)
 
-    def account_type_transactions(self, user_id: int, type_id: int):
-        """Return transactions affecting given account type ordered by time."""
-        user_id = self.family_id(user_id)
-        return self.fetchall(
-            """
-            SELECT t.ts, t.amount,
-                   ftype.name AS from_type, ttype.name AS to_type,
-                   ftype.id AS from_type_id, ttype.id AS to_type_id
-            FROM transactions t
-            JOIN accounts fa ON fa.id=t.from_account
-            JOIN account_groups fg ON fa.group_id=fg.id
-            JOIN account_types ftype ON fg.type_id=ftype.id
-            JOIN accounts ta ON ta.id=t.to_account
-            JOIN account_groups tg ON ta.group_id=tg.id
-            JOIN account_types ttype ON tg.type_id=ttype.id
-            WHERE t.user_id=? AND (ftype.id=? OR ttype.id=?)
-            ORDER BY t.ts, t.id
-            """,
-            (user_id, type_id, type_id),
-        )
+    def _balance_as_of(self, user_id: int, scope: str, key: int, ts) -> int:
+        """Return the balance of a ``BALANCE_SCOPES`` entry after ``ts``.
 
-    def account_group_transactions(self, user_id: int, group_id: int):
-        """Return transactions affecting given account group ordered by time."""
+        The last closing balance of each account before the day of ``ts``
+        is one seek on the ``(account_id, day)`` key of ``daily_balances``;
+        only the postings of that day up to ``ts`` are summed on top.
+        """
         user_id = self.family_id(user_id)
-        return self.fetchall(
-            """
-            SELECT t.ts, t.amount,
-                   ftype.name AS from_type, ttype.name AS to_type,
-                   fg.id AS from_group_id, tg.id AS to_group_id
-            FROM transactions t
-            JOIN accounts fa ON fa.id=t.from_account
-            JOIN account_groups fg ON fa.group_id=fg.id
-            JOIN account_types ftype ON fg.type_id=ftype.id
-            JOIN accounts ta ON ta.id=t.to_account
-            JOIN account_groups tg ON ta.group_id=tg.id
-            JOIN account_types ttype ON tg.type_id=ttype.id
-            WHERE t.user_id=? AND (fg.id=? OR tg.id=?)
-            ORDER BY t.ts, t.id
+        accounts, from_column, to_column = BALANCE_SCOPES[scope]
+        epoch = to_epoch(ts)
+        day = epoch_day(epoch)
+        balance = self.fetchone(
+            f"""
+            SELECT COALESCE(SUM((
+                SELECT balance FROM daily_balances
+                WHERE account_id=a.id AND day<? ORDER BY day DESC LIMIT 1
+            )), 0) AS s
+            FROM ({accounts}) a
             """,
-            (user_id, group_id, group_id),
-        )
+            (day, user_id, key),
+        )["s"]
+        for column, sign in ((to_column, 1), (from_column, -1)):
+            delta = self.fetchone(
+                f"""
+                SELECT COALESCE(SUM(amount_minor),0) AS s FROM transactions
+                WHERE user_id=? AND {column}=? AND ts_epoch>=? AND ts_epoch<=?
+                """,
+                (user_id, key, day, epoch),
+            )["s"]
+            balance += sign * delta
+        return balance
+
+    def balance_as_of(self, user_id: int, account_id: int, ts) -> int:
+        """Return account balance after all transactions up to ``ts``."""
+        return self._balance_as_of(user_id, "account", account_id, ts)
 
+    def group_balance_as_of(self, user_id: int, group_id: int, ts) -> int:
+        """Return the summed balance of a group's accounts as of ``ts``."""
+        return self._balance_as_of(user_id, "group", group_id, ts)
+
+    def type_balance_as_of(self, user_id: int, type_id: int, ts) -> int:
+        """Return the summed balance of an account type as of ``ts``."""
+        return self._balance_as_of(user_id, "type", type_id, ts)
 
 def export_archive(db_path: Path) -> bytes:
     """Return a ZIP archive with CSV files of all DB tables."""
     conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            return dump_archive(conn)
+    finally:
+        conn.close()
+
+
+def dump_archive(conn: sqlite3.Connection) -> bytes:
+    """Write every table visible to ``conn`` as CSV files into a ZIP archive."""
     cur = conn.cursor()
     tables = [row[0] for row in cur.execute(
         "SELECT name FROM sqlite_master WHERE type='table'"
     )]
+    contents = {}
+    for table in tables:
+        rows = cur.execute(f"SELECT * FROM {table}").fetchall()
+        contents[table] = ([d[0] for d in cur.description], rows)
+    return write_archive(contents)
+
+
+def write_archive(tables: dict[str, tuple[Sequence[str], Iterable[Sequence]]]) -> bytes:
+    """Pack ``{table: (columns, rows)}`` as one CSV file per table into a ZIP."""
     buf = BytesIO()
     with ZipFile(buf, "w", compression=ZIP_DEFLATED) as zf:
-        for table in tables:
-            rows = cur.execute(f"SELECT * FROM {table}").fetchall()
-            cols = [d[0] for d in cur.description]
+        for table, (cols, rows) in tables.items():
             s_buf = StringIO()
             writer = csv.writer(s_buf)
             writer.writerow(cols)
             writer.writerows(rows)
             zf.writestr(f"{table}.csv", s_buf.getvalue())
-    conn.close()
     buf.seek(0)
     return buf.getvalue()
 
 
+def read_archive(data: bytes) -> dict[str, list[dict[str, str]]]:
+    """Return the rows of every CSV file in a ZIP archive keyed by table."""
+    tables = {}
+    with ZipFile(BytesIO(data)) as zf:
+        for name in zf.namelist():
+            if not name.endswith(".csv"):
+                continue
+            reader = csv.DictReader(StringIO(zf.read(name).decode()))
+            tables[Path(name).stem] = list(reader)
+    return tables
+
+
 def import_archive(db_path: Path, data: bytes) -> None:
     """Replace DB with tables provided in the ZIP archive."""
-    if db_path.exists():
-        db_path.unlink()
+    db_path.unlink(missing_ok=True)
     db = Database(db_path)  # create schema
-    db.conn.close()
+    db.close()
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
-    with ZipFile(BytesIO(data)) as zf:
-        for name in zf.namelist():
-            if not name.endswith(".csv"):
-                continue
-            table = Path(name).stem
-            content = zf.read(name).decode()
-            reader = csv.reader(StringIO(content))
-            rows = list(reader)
-            if not rows:
-                continue
-            header = rows[0]
-            placeholders = ",".join("?" * len(header))
-            for row in rows[1:]:
-                cur.execute(
-                    f"INSERT INTO {table} ({','.join(header)}) VALUES ({placeholders})",
-                    row,
-                )
+    for table, rows in read_archive(data).items():
+        for row in rows:
+            placeholders = ",".join("?" * len(row))
+            cur.execute(
+                f"INSERT INTO {table} ({','.join(row)}) VALUES ({placeholders})",
+                list(row.values()),
+            )
     conn.commit()
     conn.close()
 
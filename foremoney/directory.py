@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping
+
+from .name_index import NameIndex
+
+
+class AccountDirectory:
+    """Names and placement of a family's accounts, groups and account types.
+
+    It is small enough to be cached per family and lets transaction rows be
+    listed and navigation keyboards be built without joining ``accounts``,
+    ``account_groups`` and ``account_types``.
+    """
+
+    def __init__(
+        self,
+        accounts: Iterable[Mapping[str, Any]],
+        groups: Iterable[Mapping[str, Any]],
+        types: Iterable[Mapping[str, Any]],
+    ) -> None:
+        accounts = list(accounts)
+        self.accounts = {a["id"]: (a["name"], a["group_id"]) for a in accounts}
+        self.archived = {a["id"] for a in accounts if a["archived"]}
+        self.groups = {g["id"]: (g["name"], g["type_id"]) for g in groups}
+        self.types = {t["id"]: t["name"] for t in types}
+        self._children: dict[tuple[str, int | None], list[dict[str, Any]]] | None = None
+        self._names: NameIndex | None = None
+
+    def placement(self, account_id: int) -> tuple[int, int] | None:
+        """Return ``(group_id, type_id)`` of an account."""
+        acc = self.accounts.get(account_id)
+        if acc is None or acc[1] not in self.groups:
+            return None
+        group_id = acc[1]
+        return group_id, self.groups[group_id][1]
+
+    def group_info(self, group_id: int) -> dict[str, str] | None:
+        group = self.groups.get(group_id)
+        if group is None:
+            return None
+        return {"group_name": group[0], "type_name": self.types.get(group[1])}
+
+    def account_type_name(self, account_id: int) -> str | None:
+        placement = self.placement(account_id)
+        return self.types.get(placement[1]) if placement else None
+
+    def children(self, kind: str, parent_id: int | None = None) -> list[dict[str, Any]]:
+        """Return ``[{"id", "name"}, ...]`` sorted by name.
+
+        ``kind`` is ``"type"`` (all account types), ``"group"`` (groups of
+        type ``parent_id``) or ``"account"`` (live accounts of group
+        ``parent_id``). The lists are built on first use.
+        """
+        if self._children is None:
+            children: dict[tuple[str, int | None], list[dict[str, Any]]] = {}
+            for tid, name in self.types.items():
+                children.setdefault(("type", None), []).append({"id": tid, "name": name})
+            for gid, (name, tid) in self.groups.items():
+                children.setdefault(("group", tid), []).append({"id": gid, "name": name})
+            for aid, (name, gid) in self.accounts.items():
+                if aid not in self.archived:
+                    children.setdefault(("account", gid), []).append({"id": aid, "name": name})
+            for items in children.values():
+                items.sort(key=lambda item: item["name"])
+            self._children = children
+        return self._children.get((kind, parent_id), [])
+
+    def name_index(self) -> NameIndex:
+        """Return the name lookup of live accounts, built on first use."""
+        if self._names is None:
+            self._names = NameIndex(
+                {
+                    "id": aid,
+                    "name": name,
+                    "group": self.groups[gid][0],
+                    "type": self.types.get(self.groups[gid][1]),
+                }
+                for aid, (name, gid) in self.accounts.items()
+                if aid not in self.archived and gid in self.groups
+            )
+        return self._names
+
+    def describe(self, tx: Mapping[str, Any]) -> dict[str, Any]:
+        """Resolve names for a transaction row with denormalized ids."""
+        return {
+            "id": tx["id"],
+            "amount": tx["amount"],
+            "ts": tx["ts"],
+            "from_name": self.accounts.get(tx["from_account"], ("?",))[0],
+            "to_name": self.accounts.get(tx["to_account"], ("?",))[0],
+            "from_group": self.groups.get(tx["from_group_id"], ("?",))[0],
+            "to_group": self.groups.get(tx["to_group_id"], ("?",))[0],
+            "from_type": self.types.get(tx["from_type_id"], "?"),
+            "to_type": self.types.get(tx["to_type_id"], "?"),
+        }
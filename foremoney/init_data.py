@@ -1,51 +1,24 @@
-from .database import Database
+from .storage import Storage
 from .constants import ACCOUNT_TYPES, ACCOUNT_GROUPS, CAPITAL_ACCOUNTS
 
 
-def seed(db: Database, user_id: int) -> None:
+def seed(db: Storage, user_id: int) -> None:
     """Initialize account types and groups for a user if not present."""
+    db = db.shard_for(user_id)
     for atype in ACCOUNT_TYPES:
-        db.execute(
-            "INSERT OR IGNORE INTO account_types (name) VALUES (?)",
-            (atype,),
-        )
+        db.add_account_type(atype)
     for atype, groups in ACCOUNT_GROUPS.items():
-        type_row = db.fetchone(
-            "SELECT id FROM account_types WHERE name=?",
-            (atype,),
-        )
-        if not type_row:
+        type_id = db.account_type_id(atype)
+        if type_id is None:
             continue
-        type_id = type_row["id"]
         for group in groups:
-            exists = db.fetchone(
-                "SELECT 1 FROM account_groups WHERE user_id=? AND type_id=? AND name=?",
-                (user_id, type_id, group),
-            )
-            if not exists:
-                db.execute(
-                    """
-                    INSERT INTO account_groups (user_id, type_id, name)
-                    VALUES (?, ?, ?)
-                    """,
-                    (user_id, type_id, group),
-                )
+            if db.find_account_group(user_id, type_id, group) is None:
+                db.add_account_group(user_id, type_id, group)
         if atype == "capital":
             for group in groups:
-                group_row = db.fetchone(
-                    "SELECT id FROM account_groups WHERE user_id=? AND type_id=? AND name=?",
-                    (user_id, type_id, group),
-                )
-                if not group_row:
+                gid = db.find_account_group(user_id, type_id, group)
+                if gid is None:
                     continue
-                gid = group_row["id"]
                 for acc in CAPITAL_ACCOUNTS.get(group, []):
-                    acc_exists = db.fetchone(
-                        "SELECT 1 FROM accounts WHERE user_id=? AND group_id=? AND name=?",
-                        (user_id, gid, acc),
-                    )
-                    if not acc_exists:
-                        db.execute(
-                            "INSERT INTO accounts (user_id, group_id, name) VALUES (?, ?, ?)",
-                            (user_id, gid, acc),
-                        )
+                    if db.find_account(user_id, gid, acc) is None:
+                        db.add_account(user_id, gid, acc)
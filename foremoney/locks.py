@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+
+class KeyedLocks:
+    """``asyncio.Lock`` per key, created on demand and dropped when unused.
+
+    Waiters acquire a key in FIFO order, so updates of one user are handled
+    in the order they arrived while other keys proceed in parallel.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[Hashable, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
@@ -0,0 +1,574 @@
+from __future__ import annotations
+
+import secrets
+from collections import Counter, defaultdict
+from typing import Any, Iterable
+
+from .database import read_archive, write_archive
+from .money import to_float, to_minor
+from .name_index import NameIndex
+from .pair_index import PairIndex
+from .storage import Row, Storage
+from .timestamps import day_end, day_start, day_start_text, epoch_day, now_text, to_epoch
+
+GROUP_COLUMNS = ("id", "user_id", "type_id", "name", "archived")
+ACCOUNT_COLUMNS = ("id", "user_id", "group_id", "name", "archived")
+TX_COLUMNS = (
+    "id", "user_id", "from_account", "to_account", "amount", "ts",
+    "from_group_id", "to_group_id", "from_type_id", "to_type_id",
+    "ts_epoch", "amount_minor",
+)
+
+
+def _int(value: str | None) -> int | None:
+    return int(value) if value not in (None, "") else None
+
+
+class MemoryDatabase(Storage):
+    """Pure in-memory :class:`Storage` for benchmarks and load tests.
+
+    Rows live in dicts keyed by id with secondary indexes per user and
+    parent id. Account balances are maintained incrementally on writes, so
+    handler overhead can be measured without any disk I/O.
+    """
+
+    def __init__(self) -> None:
+        self.cache_hits: Counter[str] = Counter()
+        self.cache_misses: Counter[str] = Counter()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._seq: dict[str, int] = defaultdict(int)
+        self._families: dict[int, int] = {}
+        self._invites: dict[str, int] = {}
+        self._types: dict[int, dict[str, Any]] = {}
+        self._type_ids: dict[str, int] = {}
+        self._groups: dict[int, dict[str, Any]] = {}
+        self._groups_by_type: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._accounts: dict[int, dict[str, Any]] = {}
+        self._accounts_by_group: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._txs: dict[int, dict[str, Any]] = {}
+        self._txs_by_user: dict[int, list[int]] = defaultdict(list)
+        self._archive: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        self._balances: dict[int, int] = defaultdict(int)
+        self._pair_indexes: dict[int, PairIndex] = {}
+        self._name_indexes: dict[int, NameIndex] = {}
+        self._settings: dict[tuple[int, str], str] = {}
+
+    def _next_id(self, table: str) -> int:
+        self._seq[table] += 1
+        return self._seq[table]
+
+    # ---- storage location ----
+
+    def recreate(self, user_id: int) -> None:
+        self._reset()
+
+    def stats(self) -> dict[str, Any]:
+        stats = super().stats()
+        stats["rows"] = {
+            "account_groups": len(self._groups),
+            "account_types": len(self._types),
+            "accounts": len(self._accounts),
+            "settings": len(self._settings),
+            "transactions": len(self._txs),
+            "transactions_archive": sum(len(rows) for rows in self._archive.values()),
+        }
+        stats["caches"] = {
+            name: (self.cache_hits[name], self.cache_misses[name])
+            for name in ("pair_index",)
+        }
+        return stats
+
+    def export_data(self, user_id: int) -> bytes:
+        """Return every table in the CSV-ZIP format used by :class:`Database`."""
+        txs = list(self._txs.values())
+        archived = [tx for rows in list(self._archive.values()) for tx in list(rows)]
+        settings = list(self._settings.items())
+        return write_archive({
+            "account_types": (("id", "name"), [
+                (t["id"], t["name"]) for t in list(self._types.values())
+            ]),
+            "account_groups": (GROUP_COLUMNS, [
+                [g[c] for c in GROUP_COLUMNS] for g in list(self._groups.values())
+            ]),
+            "accounts": (ACCOUNT_COLUMNS, [
+                [a[c] for c in ACCOUNT_COLUMNS] for a in list(self._accounts.values())
+            ]),
+            "transactions": (TX_COLUMNS, [self._tx_csv(tx) for tx in txs]),
+            "transactions_archive": (TX_COLUMNS, [self._tx_csv(tx) for tx in archived]),
+            "settings": (("id", "user_id", "key", "value"), [
+                (i, uid, key, value) for i, ((uid, key), value) in enumerate(settings, 1)
+            ]),
+            "user_family": (("user_id", "family_id"), list(self._families.items())),
+            "family_invites": (("token", "family_id"), list(self._invites.items())),
+        })
+
+    @staticmethod
+    def _tx_csv(tx: dict[str, Any]) -> list[Any]:
+        row = dict(tx, amount=to_float(tx["amount"]), amount_minor=tx["amount"])
+        return [row[c] for c in TX_COLUMNS]
+
+    def _tx_from_csv(self, row: dict[str, str]) -> dict[str, Any]:
+        amount = _int(row.get("amount_minor"))
+        epoch = _int(row.get("ts_epoch"))
+        tx = {
+            "id": int(row["id"]),
+            "user_id": int(row["user_id"]),
+            "from_account": int(row["from_account"]),
+            "to_account": int(row["to_account"]),
+            "amount": amount if amount is not None else to_minor(row["amount"]),
+            "ts": row["ts"],
+            "ts_epoch": epoch if epoch is not None else to_epoch(row["ts"]),
+        }
+        for side in ("from", "to"):
+            group_id = _int(row.get(f"{side}_group_id"))
+            if group_id is None:
+                group_id = self._accounts[tx[f"{side}_account"]]["group_id"]
+            type_id = _int(row.get(f"{side}_type_id"))
+            if type_id is None:
+                type_id = self._groups[group_id]["type_id"]
+            tx[f"{side}_group_id"] = group_id
+            tx[f"{side}_type_id"] = type_id
+        return tx
+
+    def import_data(self, user_id: int, data: bytes) -> None:
+        """Replace every table with the rows of a CSV-ZIP export."""
+        tables = read_archive(data)
+        self._reset()
+        for row in tables.get("account_types", []):
+            tid = int(row["id"])
+            self._types[tid] = {"id": tid, "name": row["name"]}
+            self._type_ids[row["name"]] = tid
+        for row in tables.get("account_groups", []):
+            group = {c: _int(row[c]) for c in ("id", "user_id", "type_id")}
+            group.update(name=row["name"], archived=_int(row.get("archived")) or 0)
+            self._groups[group["id"]] = group
+            self._groups_by_type[(group["user_id"], group["type_id"])].append(group["id"])
+        for row in tables.get("accounts", []):
+            account = {c: _int(row[c]) for c in ("id", "user_id", "group_id")}
+            account.update(name=row["name"], archived=_int(row.get("archived")) or 0)
+            self._accounts[account["id"]] = account
+            self._accounts_by_group[(account["user_id"], account["group_id"])].append(account["id"])
+        for row in tables.get("transactions", []):
+            tx = self._tx_from_csv(row)
+            self._txs[tx["id"]] = tx
+            self._txs_by_user[tx["user_id"]].append(tx["id"])
+            self._balances[tx["from_account"]] -= tx["amount"]
+            self._balances[tx["to_account"]] += tx["amount"]
+        for row in tables.get("transactions_archive", []):
+            tx = self._tx_from_csv(row)
+            self._archive[tx["user_id"]].append(tx)
+        for row in tables.get("settings", []):
+            self._settings[(int(row["user_id"]), row["key"])] = row["value"]
+        for row in tables.get("user_family", []):
+            self._families[int(row["user_id"])] = int(row["family_id"])
+        for row in tables.get("family_invites", []):
+            self._invites[row["token"]] = int(row["family_id"])
+        self._seq["account_types"] = max(self._types, default=0)
+        self._seq["account_groups"] = max(self._groups, default=0)
+        self._seq["accounts"] = max(self._accounts, default=0)
+        self._seq["transactions"] = max(
+            [*self._txs, *(tx["id"] for rows in self._archive.values() for tx in rows)],
+            default=0,
+        )
+
+    # ---- families ----
+
+    def family_id(self, user_id: int) -> int:
+        return self._families.get(user_id, user_id)
+
+    def create_family_invite(self, family_id: int) -> str:
+        token = secrets.token_urlsafe(8)
+        self._invites[token] = family_id
+        return token
+
+    def use_family_invite(self, token: str, user_id: int) -> bool:
+        family_id = self._invites.pop(token, None)
+        if family_id is None:
+            return False
+        self._families[user_id] = family_id
+        return True
+
+    # ---- account types, groups and accounts ----
+
+    def account_types(self) -> Iterable[Row]:
+        return [
+            {"id": t["id"], "name": t["name"]}
+            for t in sorted(self._types.values(), key=lambda t: t["name"])
+        ]
+
+    def add_account_type(self, name: str) -> None:
+        if name not in self._type_ids:
+            tid = self._next_id("account_types")
+            self._types[tid] = {"id": tid, "name": name}
+            self._type_ids[name] = tid
+
+    def account_type_id(self, name: str) -> int | None:
+        return self._type_ids.get(name)
+
+    def account_groups(self, user_id: int, type_id: int) -> Iterable[Row]:
+        user_id = self.family_id(user_id)
+        groups = (self._groups[g] for g in self._groups_by_type[(user_id, type_id)])
+        return [
+            {"id": g["id"], "name": g["name"]}
+            for g in sorted(groups, key=lambda g: g["name"])
+        ]
+
+    def find_account_group(self, user_id: int, type_id: int, name: str) -> int | None:
+        user_id = self.family_id(user_id)
+        for gid in self._groups_by_type[(user_id, type_id)]:
+            if self._groups[gid]["name"] == name:
+                return gid
+        return None
+
+    def _group(self, user_id: int, group_id: int) -> dict[str, Any] | None:
+        group = self._groups.get(group_id)
+        if group and group["user_id"] == self.family_id(user_id):
+            return group
+        return None
+
+    def account_group_info(self, user_id: int, group_id: int) -> Row | None:
+        group = self._group(user_id, group_id)
+        if not group:
+            return None
+        return {
+            "group_name": group["name"],
+            "type_name": self._types[group["type_id"]]["name"],
+        }
+
+    def add_account_group(self, user_id: int, type_id: int, name: str) -> int:
+        user_id = self.family_id(user_id)
+        if self.find_account_group(user_id, type_id, name) is not None:
+            raise ValueError(f"account group {name!r} already exists")
+        gid = self._next_id("account_groups")
+        self._groups[gid] = {
+            "id": gid,
+            "user_id": user_id,
+            "type_id": type_id,
+            "name": name,
+            "archived": 0,
+        }
+        self._groups_by_type[(user_id, type_id)].append(gid)
+        self._name_indexes.pop(user_id, None)
+        return gid
+
+    def update_account_group_name(self, user_id: int, group_id: int, name: str) -> None:
+        group = self._group(user_id, group_id)
+        if group:
+            group["name"] = name
+            self._name_indexes.pop(group["user_id"], None)
+
+    def archive_account_group(self, user_id: int, group_id: int) -> None:
+        group = self._group(user_id, group_id)
+        if group:
+            group["archived"] = 1
+
+    def accounts(self, user_id: int, group_id: int) -> Iterable[Row]:
+        user_id = self.family_id(user_id)
+        accs = (self._accounts[a] for a in self._accounts_by_group[(user_id, group_id)])
+        return [
+            {"id": a["id"], "name": a["name"]}
+            for a in sorted(accs, key=lambda a: a["name"])
+            if not a["archived"]
+        ]
+
+    def all_accounts(self, user_id: int, include_archived: bool = False) -> Iterable[Row]:
+        user_id = self.family_id(user_id)
+        rows = [
+            {"id": a["id"], "name": a["name"], "group_name": self._groups[a["group_id"]]["name"]}
+            for a in self._accounts.values()
+            if a["user_id"] == user_id and (include_archived or not a["archived"])
+        ]
+        return sorted(rows, key=lambda r: (r["group_name"], r["name"]))
+
+    def find_account(self, user_id: int, group_id: int, name: str) -> int | None:
+        user_id = self.family_id(user_id)
+        for aid in self._accounts_by_group[(user_id, group_id)]:
+            if self._accounts[aid]["name"] == name:
+                return aid
+        return None
+
+    def _account(self, user_id: int, account_id: int) -> dict[str, Any] | None:
+        acc = self._accounts.get(account_id)
+        if acc and acc["user_id"] == self.family_id(user_id):
+            return acc
+        return None
+
+    def account_type_name(self, user_id: int, account_id: int) -> str | None:
+        acc = self._account(user_id, account_id)
+        if not acc:
+            return None
+        return self._types[self._groups[acc["group_id"]]["type_id"]]["name"]
+
+    def name_index(self, user_id: int) -> NameIndex:
+        user_id = self.family_id(user_id)
+        index = self._name_indexes.get(user_id)
+        if index is None:
+            index = self._name_indexes[user_id] = NameIndex(
+                {
+                    "id": a["id"],
+                    "name": a["name"],
+                    "group": self._groups[a["group_id"]]["name"],
+                    "type": self._types[self._groups[a["group_id"]]["type_id"]]["name"],
+                }
+                for a in self._accounts.values()
+                if a["user_id"] == user_id and not a["archived"]
+            )
+        return index
+
+    def add_account(self, user_id: int, group_id: int, name: str) -> int:
+        user_id = self.family_id(user_id)
+        aid = self._next_id("accounts")
+        self._accounts[aid] = {
+            "id": aid,
+            "user_id": user_id,
+            "group_id": group_id,
+            "name": name,
+            "archived": 0,
+        }
+        self._accounts_by_group[(user_id, group_id)].append(aid)
+        self._name_indexes.pop(user_id, None)
+        return aid
+
+    def update_account_name(self, user_id: int, account_id: int, name: str) -> None:
+        acc = self._account(user_id, account_id)
+        if acc:
+            acc["name"] = name
+            self._name_indexes.pop(acc["user_id"], None)
+
+    def archive_account(self, user_id: int, account_id: int) -> None:
+        acc = self._account(user_id, account_id)
+        if acc:
+            acc["archived"] = 1
+            self._name_indexes.pop(acc["user_id"], None)
+
+    # ---- transactions ----
+
+    def add_transaction(
+        self,
+        user_id: int,
+        from_id: int,
+        to_id: int,
+        amount: int,
+        ts: str | None = None,
+    ) -> int:
+        user_id = self.family_id(user_id)
+        if ts is None:
+            ts = now_text()
+        tx_id = self._next_id("transactions")
+        from_group = self._groups[self._accounts[from_id]["group_id"]]
+        to_group = self._groups[self._accounts[to_id]["group_id"]]
+        self._txs[tx_id] = {
+            "id": tx_id,
+            "user_id": user_id,
+            "from_account": from_id,
+            "to_account": to_id,
+            "amount": amount,
+            "ts": ts,
+            "ts_epoch": to_epoch(ts),
+            "from_group_id": from_group["id"],
+            "to_group_id": to_group["id"],
+            "from_type_id": from_group["type_id"],
+            "to_type_id": to_group["type_id"],
+        }
+        self._txs_by_user[user_id].append(tx_id)
+        self._balances[from_id] -= amount
+        self._balances[to_id] += amount
+        self._post_pair(user_id, self._txs[tx_id], 1)
+        return tx_id
+
+    def _tx_row(self, tx: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": tx["id"],
+            "amount": tx["amount"],
+            "ts": tx["ts"],
+            "from_name": self._accounts[tx["from_account"]]["name"],
+            "to_name": self._accounts[tx["to_account"]]["name"],
+            "from_group": self._groups[tx["from_group_id"]]["name"],
+            "to_group": self._groups[tx["to_group_id"]]["name"],
+            "from_type": self._types[tx["from_type_id"]]["name"],
+            "to_type": self._types[tx["to_type_id"]]["name"],
+        }
+
+    def _matches(self, tx: dict[str, Any], filters: dict) -> bool:
+        if filters.get("min_date") and tx["ts_epoch"] < day_start(filters["min_date"]):
+            return False
+        if filters.get("max_date") and tx["ts_epoch"] >= day_end(filters["max_date"]):
+            return False
+        if filters.get("min_amount") is not None and tx["amount"] < filters["min_amount"]:
+            return False
+        if filters.get("max_amount") is not None and tx["amount"] > filters["max_amount"]:
+            return False
+        if filters.get("group_id"):
+            if filters["group_id"] not in (tx["from_group_id"], tx["to_group_id"]):
+                return False
+        if filters.get("account_id"):
+            if filters["account_id"] not in (tx["from_account"], tx["to_account"]):
+                return False
+        return True
+
+    def transactions(
+        self,
+        user_id: int,
+        limit: int,
+        offset: int,
+        filters: dict | None = None,
+    ) -> Iterable[Row]:
+        user_id = self.family_id(user_id)
+        if filters and filters.get("archived"):
+            txs = reversed(self._archive[user_id])
+        else:
+            txs = (self._txs[t] for t in reversed(self._txs_by_user[user_id]))
+        result = []
+        skipped = 0
+        for tx in txs:
+            if filters and not self._matches(tx, filters):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            result.append(self._tx_row(tx))
+            if len(result) >= limit:
+                break
+        return result
+
+    def _tx(self, user_id: int, tx_id: int) -> dict[str, Any] | None:
+        tx = self._txs.get(tx_id)
+        if tx and tx["user_id"] == self.family_id(user_id):
+            return tx
+        return None
+
+    def transaction(self, user_id: int, tx_id: int, archived: bool = False) -> Row | None:
+        if archived:
+            for tx in self._archive[self.family_id(user_id)]:
+                if tx["id"] == tx_id:
+                    return self._tx_row(tx)
+            return None
+        tx = self._tx(user_id, tx_id)
+        return self._tx_row(tx) if tx else None
+
+    def delete_transaction(self, user_id: int, tx_id: int) -> None:
+        tx = self._tx(user_id, tx_id)
+        if not tx:
+            return
+        del self._txs[tx_id]
+        self._txs_by_user[tx["user_id"]].remove(tx_id)
+        self._balances[tx["from_account"]] += tx["amount"]
+        self._balances[tx["to_account"]] -= tx["amount"]
+        self._post_pair(tx["user_id"], tx, -1)
+
+    def update_transaction_amount(self, user_id: int, tx_id: int, amount: int) -> None:
+        tx = self._tx(user_id, tx_id)
+        if not tx:
+            return
+        delta = amount - tx["amount"]
+        tx["amount"] = amount
+        self._balances[tx["from_account"]] -= delta
+        self._balances[tx["to_account"]] += delta
+
+    def close_period(self, user_id: int, before: str) -> int:
+        user_id = self.family_id(user_id)
+        epoch = day_start(before)
+        ts = day_start_text(before)
+        corr = self.correction_account(user_id)
+        keep = []
+        balances: dict[int, int] = defaultdict(int)
+        for tx_id in self._txs_by_user[user_id]:
+            tx = self._txs[tx_id]
+            if tx["ts_epoch"] >= epoch:
+                keep.append(tx_id)
+                continue
+            self._archive[user_id].append(self._txs.pop(tx_id))
+            balances[tx["to_account"]] += tx["amount"]
+            balances[tx["from_account"]] -= tx["amount"]
+        moved = len(self._txs_by_user[user_id]) - len(keep)
+        self._txs_by_user[user_id] = keep
+        for account_id, balance in balances.items():
+            self._balances[account_id] -= balance
+        for account_id, balance in sorted(balances.items()):
+            if account_id == corr or not balance:
+                continue
+            if balance > 0:
+                self.add_transaction(user_id, corr, account_id, balance, ts)
+            else:
+                self.add_transaction(user_id, account_id, corr, -balance, ts)
+        self._pair_indexes.pop(user_id, None)
+        return moved
+
+    def account_balance(self, user_id: int, account_id: int) -> int:
+        if not self._account(user_id, account_id):
+            return 0
+        return self._balances[account_id]
+
+    def pair_index(self, user_id: int) -> PairIndex:
+        user_id = self.family_id(user_id)
+        index = self._pair_indexes.get(user_id)
+        if index is None:
+            txs = sorted(
+                (self._txs[t] for t in self._txs_by_user[user_id]),
+                key=lambda tx: tx["ts_epoch"],
+            )
+            index = self._pair_indexes[user_id] = PairIndex(txs)
+            self.cache_misses["pair_index"] += 1
+        else:
+            self.cache_hits["pair_index"] += 1
+        return index
+
+    def _post_pair(self, user_id: int, tx: dict[str, Any], count: int) -> None:
+        index = self._pair_indexes.get(user_id)
+        if index is not None:
+            index.post(tx, count)
+
+    def _balance_as_of(self, user_id: int, key: str, value: int, ts) -> int:
+        epoch = to_epoch(ts)
+        balance = 0
+        for tx_id in self._txs_by_user[self.family_id(user_id)]:
+            tx = self._txs[tx_id]
+            if tx["ts_epoch"] > epoch:
+                continue
+            if tx[f"to_{key}"] == value:
+                balance += tx["amount"]
+            if tx[f"from_{key}"] == value:
+                balance -= tx["amount"]
+        return balance
+
+    def balance_as_of(self, user_id: int, account_id: int, ts) -> int:
+        return self._balance_as_of(user_id, "account", account_id, ts)
+
+    def group_balance_as_of(self, user_id: int, group_id: int, ts) -> int:
+        return self._balance_as_of(user_id, "group_id", group_id, ts)
+
+    def type_balance_as_of(self, user_id: int, type_id: int, ts) -> int:
+        return self._balance_as_of(user_id, "type_id", type_id, ts)
+
+    def _history(self, user_id: int, key: str, value: int) -> list[tuple[int, int]]:
+        user_id = self.family_id(user_id)
+        deltas: dict[int, int] = defaultdict(int)
+        for tx_id in self._txs_by_user[user_id]:
+            tx = self._txs[tx_id]
+            day = epoch_day(tx["ts_epoch"])
+            if tx[f"to_{key}"] == value:
+                deltas[day] += tx["amount"]
+            if tx[f"from_{key}"] == value:
+                deltas[day] -= tx["amount"]
+        points = []
+        total = 0
+        for day in sorted(deltas):
+            total += deltas[day]
+            points.append((day, total))
+        return points
+
+    def account_type_history(self, user_id: int, type_id: int) -> list[tuple[int, int]]:
+        return self._history(user_id, "type_id", type_id)
+
+    def account_group_history(self, user_id: int, group_id: int) -> list[tuple[int, int]]:
+        return self._history(user_id, "group_id", group_id)
+
+    # ---- settings ----
+
+    def set_setting(self, user_id: int, key: str, value: str) -> None:
+        self._settings[(self.family_id(user_id), key)] = value
+
+    def get_setting(self, user_id: int, key: str) -> str | None:
+        return self._settings.get((self.family_id(user_id), key))
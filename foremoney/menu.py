@@ -1,7 +1,13 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from .init_data import seed
+from .ui import reply_keyboard
+
+MAIN_MENU_KEYBOARD = reply_keyboard((
+    ("Dashboard", "Create transaction"),
+    ("Transactions", "Settings"),
+))
 
 class MenuMixin:
     """Main menu and basic commands."""
@@ -28,11 +34,7 @@ class MenuMixin:
         )
 
     def main_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [KeyboardButton("Dashboard"), KeyboardButton("Create transaction")],
-            [KeyboardButton("Transactions"), KeyboardButton("Settings")],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return MAIN_MENU_KEYBOARD
 
     async def handle_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         text = update.message.text
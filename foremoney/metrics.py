@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Any, Callable
+
+from telegram.ext import Application, ConversationHandler
+from telegram.request import HTTPXRequest
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+current_handler: ContextVar[str] = ContextVar("current_handler", default="")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+class Metrics:
+    """In-process latency histograms rendered in Prometheus text format.
+
+    The most recent ``recent_size`` handler latencies are also kept with
+    their time, for percentiles over a sliding window.
+    """
+
+    def __init__(self, recent_size: int = 10000) -> None:
+        self.handlers: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self.api: dict[tuple[str, str], Histogram] = {}
+        self.charts: dict[str, Histogram] = {}
+        self.recent: deque[tuple[float, float]] = deque(maxlen=recent_size)
+        # BackupManager.metrics when scheduled backups are enabled
+        self.backups: Callable[[], dict[str, Any]] | None = None
+
+    @staticmethod
+    def _histogram(table: dict, key) -> Histogram:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = Histogram()
+        return hist
+
+    def observe_handler(self, name: str, seconds: float, failed: bool = False) -> None:
+        self._histogram(self.handlers, name).observe(seconds)
+        self.recent.append((monotonic(), seconds))
+        if failed:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def recent_latency(
+        self, window: float, quantiles: tuple[float, ...] = (0.5, 0.95)
+    ) -> tuple[int, list[float]]:
+        """Return the number of handler calls in the last ``window`` seconds
+        and their latency at each of ``quantiles``."""
+        since = monotonic() - window
+        values = sorted(seconds for at, seconds in self.recent if at >= since)
+        if not values:
+            return 0, [0.0] * len(quantiles)
+        return len(values), [
+            values[min(len(values) - 1, int(q * len(values)))] for q in quantiles
+        ]
+
+    def observe_api(self, method: str, seconds: float) -> None:
+        self._histogram(self.api, (current_handler.get(), method)).observe(seconds)
+
+    @contextmanager
+    def chart(self, name: str):
+        """Time rendering of the chart ``name``."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._histogram(self.charts, name).observe(perf_counter() - start)
+
+    def wrap(self, name: str, callback: Callable) -> Callable:
+        """Return ``callback`` recording its latency and errors under ``name``."""
+
+        @functools.wraps(callback)
+        async def timed(update, context):
+            token = current_handler.set(name)
+            start = perf_counter()
+            failed = False
+            try:
+                return await callback(update, context)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self.observe_handler(name, perf_counter() - start, failed)
+                current_handler.reset(token)
+
+        return timed
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def histogram(metric: str, doc: str, table: dict, label_names: tuple[str, ...]):
+            lines.append(f"# HELP {metric} {doc}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, hist in sorted(table.items()):
+                values = key if isinstance(key, tuple) else (key,)
+                labels = _labels(**dict(zip(label_names, values)))
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), hist.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {hist.total:.6f}")
+                lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+
+        histogram(
+            "foremoney_handler_seconds", "Latency of bot handlers.",
+            self.handlers, ("handler",),
+        )
+        lines.append("# HELP foremoney_handler_errors_total Handler calls that raised.")
+        lines.append("# TYPE foremoney_handler_errors_total counter")
+        for name, count in sorted(self.errors.items()):
+            lines.append(f"foremoney_handler_errors_total{{{_labels(handler=name)}}} {count}")
+        histogram(
+            "foremoney_telegram_api_seconds", "Duration of Telegram Bot API calls.",
+            self.api, ("handler", "method"),
+        )
+        histogram(
+            "foremoney_chart_render_seconds", "Time spent rendering charts.",
+            self.charts, ("chart",),
+        )
+        if self.backups is not None:
+            backup = self.backups()
+            for metric, kind, doc, key in (
+                ("foremoney_backup_snapshots_total", "counter", "Completed backup snapshots.", "snapshots"),
+                ("foremoney_backup_failures_total", "counter", "Failed backup runs.", "failures"),
+                ("foremoney_backup_restarts_total", "counter", "Backup copies restarted by writes.", "restarts"),
+                ("foremoney_backup_last_duration_seconds", "gauge", "Duration of the last snapshot.", "last_duration_seconds"),
+                ("foremoney_backup_last_size_bytes", "gauge", "Size of the last snapshot.", "last_size_bytes"),
+            ):
+                if backup[key] is None:
+                    continue
+                lines.append(f"# HELP {metric} {doc}")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {backup[key]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """Write the exposition atomically, e.g. for node_exporter's textfile collector."""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.render())
+        tmp.replace(path)
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+        """Serve the exposition over HTTP on a local port."""
+
+        async def respond(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + b"Connection: close\r\n\r\n"
+                    + body
+                )
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(respond, host, port)
+
+
+class TimedRequest(HTTPXRequest):
+    """``HTTPXRequest`` recording the duration of every Bot API call."""
+
+    def __init__(self, metrics: Metrics, *args: Any, **kwargs: Any) -> None:
+        # a custom request skips the builder's defaults, whose pool has 256
+        # connections; HTTPXRequest alone would serialize calls through one
+        kwargs.setdefault("connection_pool_size", 256)
+        kwargs.setdefault("pool_timeout", 5.0)
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any):
+        start = perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            self.metrics.observe_api(url.rsplit("/", 1)[-1], perf_counter() - start)
+
+
+def instrument_handlers(application: Application, metrics: Metrics) -> None:
+    """Wrap callbacks of all registered handlers, including conversation states."""
+
+    def wrap(handler) -> None:
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                wrap(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    wrap(inner)
+            return
+        callback = getattr(handler, "callback", None)
+        if callback is not None and not hasattr(callback, "__wrapped__"):
+            handler.callback = metrics.wrap(callback.__name__, callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            wrap(handler)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Amounts are stored and aggregated as integer minor units (cents).
+DIGITS = 2
+SCALE = 10 ** DIGITS
+# Largest accepted amount in minor units: sums of many such amounts still fit
+# SQLite's 64-bit integers
+MAX_MINOR = 10 ** 15
+
+
+def to_minor(value: float | str | Decimal) -> int:
+    """Convert a major-unit amount to integer minor units."""
+    return int((Decimal(str(value)) * SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def parse_amount(text: str) -> int:
+    """Parse user input such as ``12.50`` into minor units.
+
+    Raises ``ValueError`` for anything that is not a finite number or whose
+    magnitude exceeds ``MAX_MINOR`` minor units.
+    """
+    try:
+        value = Decimal(text.strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"invalid amount: {text!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"invalid amount: {text!r}")
+    if abs(value) > Decimal(MAX_MINOR) / SCALE:
+        raise ValueError(f"amount too large: {text!r}")
+    return to_minor(value)
+
+
+def format_amount(minor: int) -> str:
+    """Return minor units as a decimal string, e.g. ``1250`` -> ``12.50``."""
+    sign = "-" if minor < 0 else ""
+    units, cents = divmod(abs(int(minor)), SCALE)
+    return f"{sign}{units}.{cents:0{DIGITS}d}"
+
+
+def to_float(minor: int) -> float:
+    """Return minor units as a float for charts and the legacy REAL column."""
+    return minor / SCALE
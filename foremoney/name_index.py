@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import difflib
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Iterable, Mapping
+
+
+def normalize(text: str) -> str:
+    """Casefold and collapse whitespace, ``:`` and ``/`` into single spaces."""
+    return re.sub(r"[\s:/]+", " ", text.casefold()).strip()
+
+
+class NameIndex:
+    """Lookup of a family's accounts by account or group name.
+
+    Every live account is reachable by its name, its group's name and
+    ``"group account"``. :meth:`lookup` tries an exact key, then keys
+    starting with the text, then close matches. Capital accounts are left
+    out: they are not used for everyday transactions and mirror the names
+    of the asset and expenditure groups. Backends rebuild the index when
+    accounts or groups are added, renamed or archived.
+    """
+
+    def __init__(self, accounts: Iterable[Mapping[str, Any]]) -> None:
+        self.labels: dict[int, str] = {}
+        keys: dict[str, set[int]] = defaultdict(set)
+        for acc in accounts:
+            if acc["type"] == "capital":
+                continue
+            self.labels[acc["id"]] = f"{acc['group']}: {acc['name']}"
+            for key in (acc["name"], acc["group"], f"{acc['group']} {acc['name']}"):
+                keys[normalize(key)].add(acc["id"])
+        self.keys = {key: sorted(ids) for key, ids in keys.items()}
+        self.sorted_keys = sorted(self.keys)
+
+    def lookup(self, text: str, cutoff: float = 0.75) -> list[int]:
+        """Return ids of the accounts ``text`` may refer to."""
+        query = normalize(text)
+        if not query:
+            return []
+        if query in self.keys:
+            return self.keys[query]
+        found: set[int] = set()
+        i = bisect_left(self.sorted_keys, query)
+        while i < len(self.sorted_keys) and self.sorted_keys[i].startswith(query):
+            found.update(self.keys[self.sorted_keys[i]])
+            i += 1
+        if not found:
+            for key in difflib.get_close_matches(query, self.sorted_keys, n=3, cutoff=cutoff):
+                found.update(self.keys[key])
+        return sorted(found)
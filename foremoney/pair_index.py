@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import heapq
+from typing import Any, Iterable, Mapping
+
+DAY = 86400
+
+
+class PairIndex:
+    """Recency-weighted counts of a family's (from account, to account) pairs.
+
+    A transaction at ``epoch`` weighs ``2 ** ((epoch - base) / half_life)``,
+    so a pair used ``half_life`` seconds later counts twice as much. The
+    ranking of weights decayed to any common moment is the same as that of
+    the stored sums, which is why an insert touches one entry only instead
+    of decaying all of them. Backends build it lazily from recent postings
+    and keep it current on every insert and delete.
+
+    When only the postings from ``since`` on were loaded, older ones are
+    ignored, so deleting a transaction that was never counted does not
+    subtract it.
+    """
+
+    def __init__(
+        self,
+        postings: Iterable[Mapping[str, Any]] = (),
+        half_life: float = 30 * DAY,
+        since: int | None = None,
+    ) -> None:
+        self.half_life = half_life
+        self.since = since
+        self.base: int | None = None
+        self.scores: dict[tuple[int, int], float] = {}
+        for row in postings:
+            self.post(row, 1)
+
+    def _weight(self, epoch: int) -> float:
+        if self.base is None:
+            self.base = epoch
+        exponent = (epoch - self.base) / self.half_life
+        if exponent > 512:
+            # move the base forward before the weights overflow
+            shift = 2.0 ** -exponent
+            self.scores = {pair: score * shift for pair, score in self.scores.items()}
+            self.base = epoch
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def post(self, row: Mapping[str, Any], count: int) -> None:
+        """Add (``count=1``) or remove (``count=-1``) one transaction."""
+        if self.since is not None and row["ts_epoch"] < self.since:
+            return
+        pair = (row["from_account"], row["to_account"])
+        weight = self._weight(row["ts_epoch"])
+        score = self.scores.get(pair, 0.0) + count * weight
+        # removing the last transaction of a pair leaves rounding noise
+        if score > weight * 1e-9:
+            self.scores[pair] = score
+        else:
+            self.scores.pop(pair, None)
+
+    def top(self, limit: int) -> list[tuple[int, int]]:
+        return heapq.nlargest(limit, self.scores, key=self.scores.__getitem__)
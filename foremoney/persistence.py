@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS conversation_states (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state INTEGER NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_states (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    )
+    """,
+]
+
+
+def state_path(database_path: Path) -> Path:
+    """Return the file kept next to the database for conversation state.
+
+    It is separate because recreating or importing the database replaces
+    its file, which would leave an open connection writing to a deleted one.
+    """
+    path = Path(database_path)
+    return path.with_name(f"{path.stem}.state.sqlite3")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": sorted(value)}
+    raise TypeError(f"{type(value).__name__} is not persisted")
+
+
+def _object_hook(value: dict) -> Any:
+    if value.keys() == {"__set__"}:
+        return set(value["__set__"])
+    return value
+
+
+def encode(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), default=_default)
+
+
+def decode(text: str) -> Any:
+    return json.loads(text, object_hook=_object_hook)
+
+
+class SQLitePersistence(BasePersistence):
+    """Conversation states and ``user_data`` as JSON rows in SQLite.
+
+    The application hands over changed users and conversations every
+    ``update_interval`` seconds and on shutdown; they are buffered and
+    written in one transaction instead of one per row. Chat, bot and
+    callback data are not stored.
+    """
+
+    def __init__(self, path: Path, update_interval: float = 10) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        self.conn.commit()
+        self._users: dict[int, str | None] = {}
+        self._states: dict[tuple[str, str], Any] = {}
+        self._scheduled: asyncio.Handle | None = None
+        self.writes = 0
+
+    # ---- loading ----
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {
+            user_id: decode(data)
+            for user_id, data in self.conn.execute("SELECT user_id, data FROM user_states")
+        }
+
+    async def get_conversations(self, name: str) -> dict:
+        return {
+            tuple(json.loads(key)): state
+            for key, state in self.conn.execute(
+                "SELECT key, state FROM conversation_states WHERE name=?", (name,)
+            )
+        }
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    # ---- buffered updates ----
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Any) -> None:
+        self._states[(name, json.dumps(key))] = new_state
+        self._schedule()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # encoded now: the dict keeps changing until the next write
+        self._users[user_id] = encode(data) if data else None
+        self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users[user_id] = None
+        self._schedule()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+        self._write()
+
+    def _schedule(self) -> None:
+        # the application updates all changed rows back to back; write
+        # them together once it yields
+        if self._scheduled is None:
+            self._scheduled = asyncio.get_running_loop().call_soon(self._write)
+
+    def _write(self) -> None:
+        self._scheduled = None
+        users, self._users = self._users, {}
+        states, self._states = self._states, {}
+        if not users and not states:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO user_states (user_id, data) VALUES (?, ?)",
+                    [(user_id, data) for user_id, data in users.items() if data is not None],
+                )
+                self.conn.executemany(
+                    "DELETE FROM user_states WHERE user_id=?",
+                    [(user_id,) for user_id, data in users.items() if data is None],
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO conversation_states (name, key, state) VALUES (?, ?, ?)",
+                    [(*key, state) for key, state in states.items() if state is not None],
+                )
+                self.conn.executemany(
+                    "DELETE FROM conversation_states WHERE name=? AND key=?",
+                    [key for key, state in states.items() if state is None],
+                )
+        except sqlite3.Error:
+            logger.exception("Writing conversation state failed")
+            # retry with the next write unless newer values arrived meanwhile
+            for user_id, data in users.items():
+                self._users.setdefault(user_id, data)
+            for key, state in states.items():
+                self._states.setdefault(key, state)
+            return
+        self.writes += 1
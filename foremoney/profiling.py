@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import tracemalloc
+from time import monotonic
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """``cProfile`` (and optionally ``tracemalloc``) over a window of updates.
+
+    :meth:`start` arms the profiler for the next ``updates`` updates and/or
+    ``seconds`` seconds. The update processor calls :meth:`enter` and
+    :meth:`exit` around updates only while :attr:`active` is set, so nothing
+    is profiled or checked beyond that flag otherwise. When the window ends
+    the report is passed to the ``on_report`` coroutine function. Work done
+    in worker threads is not profiled.
+    """
+
+    def __init__(self, lines: int = 40) -> None:
+        self.lines = lines
+        self.active = False
+        self._profile: cProfile.Profile | None = None
+        self._running = 0
+        self._remaining: int | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._memory = False
+        self._on_report: Callable[[bytes], Awaitable[None]] | None = None
+        self._started = 0.0
+        self._updates = 0
+
+    @property
+    def running(self) -> bool:
+        """True from :meth:`start` until the report has been handed off."""
+        return self._profile is not None
+
+    def start(
+        self,
+        on_report: Callable[[bytes], Awaitable[None]],
+        updates: int | None = None,
+        seconds: float | None = None,
+        memory: bool = False,
+    ) -> None:
+        if self.running:
+            raise RuntimeError("profiling is already running")
+        self._profile = cProfile.Profile()
+        self._remaining = updates
+        self._memory = memory
+        self._on_report = on_report
+        self._started = monotonic()
+        self._updates = 0
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        else:
+            self._memory = False
+        if seconds:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        self.active = True
+
+    def enter(self) -> None:
+        if not self._running:
+            self._profile.enable()
+        self._running += 1
+
+    def exit(self) -> None:
+        self._running -= 1
+        self._updates += 1
+        if self._remaining is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self.active = False
+        if not self._running:
+            self._profile.disable()
+            if not self.active:
+                self._finish()
+
+    def stop(self) -> None:
+        """End the window; updates still in flight are profiled to the end."""
+        self.active = False
+        if self._profile is not None and not self._running:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        profile, self._profile = self._profile, None
+        snapshot = None
+        if self._memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        header = f"{self._updates} updates in {monotonic() - self._started:.1f}s\n\n"
+        asyncio.get_running_loop().create_task(
+            self._send(header, profile, snapshot), name="profile_report"
+        )
+
+    async def _send(self, header: str, profile: cProfile.Profile, snapshot) -> None:
+        try:
+            report = await asyncio.to_thread(self.report, profile, snapshot)
+            await self._on_report((header + report).encode())
+        except Exception:
+            logger.exception("Sending the profile report failed")
+
+    def report(self, profile: cProfile.Profile, snapshot: tracemalloc.Snapshot | None = None) -> str:
+        out = io.StringIO()
+        profile.create_stats()
+        if not profile.stats:
+            out.write("No updates were profiled.\n")
+        for key in ("cumulative", "tottime") if profile.stats else ():
+            out.write(f"==== sorted by {key} ====\n")
+            pstats.Stats(profile, stream=out).sort_stats(key).print_stats(self.lines)
+        if snapshot is not None:
+            out.write("==== top allocations ====\n")
+            for stat in snapshot.statistics("lineno")[: self.lines]:
+                out.write(f"{stat}\n")
+        return out.getvalue()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import re
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from .money import format_amount, parse_amount
+from .transactions.helpers import format_transaction
+from .ui import inline_keyboard
+
+USAGE = "Usage: /tx 12.50 debit card > Food"
+# plain messages handled as quick entries outside of conversations
+QUICK_ENTRY_PATTERN = r"^\s*\d[\d.,]*\s+[^>]+>.+$"
+MAX_CHOICES = 8
+
+
+def parse_quick_entry(text: str) -> tuple[int, str, str]:
+    """Split ``"12.50 debit card > Food"`` into amount and the two names."""
+    match = re.fullmatch(r"\s*(\S+)\s+([^>]+?)\s*>\s*(.+?)\s*", text)
+    if not match:
+        raise ValueError("expected AMOUNT FROM > TO")
+    try:
+        amount = parse_amount(match.group(1))
+    except ValueError:
+        raise ValueError(f"invalid amount '{match.group(1)}'") from None
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    return amount, match.group(2), match.group(3)
+
+
+class QuickEntryMixin:
+    """Create a transaction from one line such as ``/tx 12.50 cash > Food``."""
+
+    async def quick_tx_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self._quick_entry(update, " ".join(context.args))
+
+    async def quick_tx_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self._quick_entry(update, update.message.text)
+
+    async def _quick_entry(self, update: Update, text: str) -> None:
+        try:
+            amount, from_name, to_name = parse_quick_entry(text)
+        except ValueError as exc:
+            await update.message.reply_text(f"Cannot read it: {exc}\n{USAGE}")
+            return
+        user_id = update.effective_user.id
+        index = self.db.name_index(user_id)
+        from_ids = index.lookup(from_name)
+        to_ids = index.lookup(to_name)
+        for name, ids in ((from_name, from_ids), (to_name, to_ids)):
+            if not ids:
+                await update.message.reply_text(f"No account matches '{name}'")
+                return
+        choices = [(f, t) for f in from_ids for t in to_ids if f != t]
+        if not choices:
+            await update.message.reply_text("Source and destination are the same account")
+            return
+        if len(choices) == 1:
+            await self._quick_save(update.message, user_id, *choices[0], amount)
+            return
+        if len(choices) > MAX_CHOICES:
+            await update.message.reply_text(
+                f"'{from_name}' and '{to_name}' match {len(choices)} account pairs, "
+                "please be more specific"
+            )
+            return
+        rows = tuple(
+            ((f"{index.labels[f]} \u2192 {index.labels[t]}", f"qtx:{f}:{t}:{amount}"),)
+            for f, t in choices
+        )
+        await update.message.reply_text(
+            f"Which accounts for {format_amount(amount)}?",
+            reply_markup=inline_keyboard(rows + ((("Cancel", "qtx:cancel"),),)),
+        )
+
+    async def quick_tx_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        await query.answer()
+        if query.data == "qtx:cancel":
+            await query.edit_message_text("Cancelled")
+            return
+        from_id, to_id, amount = (int(v) for v in query.data.split(":")[1:])
+        user_id = update.effective_user.id
+        labels = self.db.name_index(user_id).labels
+        if from_id not in labels or to_id not in labels:
+            await query.edit_message_text("These accounts are no longer available")
+            return
+        # the choice is made once: the keyboard goes away with the edit
+        await query.edit_message_text(f"{labels[from_id]} \u2192 {labels[to_id]}")
+        await self._quick_save(query.message, user_id, from_id, to_id, amount)
+
+    async def _quick_save(self, message, user_id: int, from_id: int, to_id: int, amount: int) -> None:
+        tx_id = await self.writes.submit(user_id, "add_transaction", from_id, to_id, amount)
+        tx = self.db.transaction(user_id, tx_id)
+        await message.reply_text(format_transaction(tx))
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# ``rate_limit_args`` of a request: interactive replies go first
+INTERACTIVE = 0
+BULK = 1
+
+MAX_TEXT = 4096
+# besides these, coalesced messages must carry identical parameters
+_MERGED_KEYS = {"text", "reply_markup"}
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``capacity`` saved up."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` tokens are available."""
+        self._refill(now)
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Pending:
+    __slots__ = ("priority", "seq", "chat_id", "endpoint", "data", "callback", "args", "kwargs", "future")
+
+    def __init__(self, priority, seq, chat_id, endpoint, data, callback, args, kwargs, future) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.endpoint = endpoint
+        self.data = data
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+class RateLimiter(BaseRateLimiter):
+    """Schedule outgoing Bot API calls within Telegram's flood limits.
+
+    Calls addressed to a chat wait for a token of the global bucket and of
+    the chat's bucket (groups get the lower group rate); other calls such as
+    ``answerCallbackQuery`` are sent straight away. Waiting calls are sent
+    by priority (``rate_limit_args=BULK`` yields to interactive replies),
+    a chat's calls one at a time and in order. A text queued right behind
+    another text to the same chat is merged into it. On ``RetryAfter`` all
+    sending pauses for the requested time before the call is retried.
+    """
+
+    def __init__(
+        self,
+        overall_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        bulk_reserve: float = 5,
+        max_retries: int = 2,
+    ) -> None:
+        self.overall = TokenBucket(overall_rate, overall_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        # global tokens kept for interactive replies while bulk sends wait
+        self.bulk_reserve = bulk_reserve
+        self.max_retries = max_retries
+        self._chats: dict[Any, TokenBucket] = {}
+        self._queue: list[_Pending] = []
+        self._busy: set[Any] = set()
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._sending: set[asyncio.Task] = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="rate_limiter")
+
+    async def shutdown(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # whatever is still queued is sent without waiting
+        queued, self._queue = self._queue, []
+        for pending in queued:
+            await self._send(pending)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._task is None:
+            return await callback(*args, **kwargs)
+        priority = INTERACTIVE if rate_limit_args is None else rate_limit_args
+        if endpoint == "sendMessage":
+            target = self._coalesce_target(chat_id, priority, data)
+            if target is not None:
+                target.data["text"] += "\n\n" + data["text"]
+                if data.get("reply_markup") is not None:
+                    target.data["reply_markup"] = data["reply_markup"]
+                self.coalesced += 1
+                return await target.future
+        pending = _Pending(
+            priority, next(self._seq), chat_id, endpoint, data, callback, args, kwargs,
+            asyncio.get_running_loop().create_future(),
+        )
+        self._queue.append(pending)
+        self._wakeup.set()
+        return await pending.future
+
+    def _coalesce_target(self, chat_id: Any, priority: int, data: dict[str, Any]) -> _Pending | None:
+        last = next((p for p in reversed(self._queue) if p.chat_id == chat_id), None)
+        if (
+            last is None
+            or last.endpoint != "sendMessage"
+            or last.priority != priority
+            or last.data.get("reply_markup") is not None
+            or len(last.data["text"]) + len(data["text"]) + 2 > MAX_TEXT
+        ):
+            return None
+        keys = (last.data.keys() | data.keys()) - _MERGED_KEYS
+        if any(last.data.get(key) != data.get(key) for key in keys):
+            return None
+        return last
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = (
+                TokenBucket(self.group_rate, 1) if group
+                else TokenBucket(self.chat_rate, self.chat_burst)
+            )
+        return bucket
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            wait = self._paused_until - now if now < self._paused_until else None
+            if wait is None:
+                for pending in sorted(self._queue, key=lambda p: (p.priority, p.seq)):
+                    if pending.chat_id in self._busy:
+                        continue
+                    need = 1
+                    if pending.priority != INTERACTIVE:
+                        need = min(1 + self.bulk_reserve, self.overall.capacity)
+                    bucket = self._bucket(pending.chat_id)
+                    delay = max(bucket.delay(now), self.overall.delay(now, need))
+                    if delay > 0:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    bucket.take(now)
+                    self.overall.take(now)
+                    self._queue.remove(pending)
+                    self._busy.add(pending.chat_id)
+                    task = loop.create_task(self._dispatch(pending))
+                    self._sending.add(task)
+                    task.add_done_callback(self._sending.discard)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, pending: _Pending) -> None:
+        try:
+            await self._send(pending)
+        finally:
+            self._busy.discard(pending.chat_id)
+            self._wakeup.set()
+
+    async def _send(self, pending: _Pending) -> None:
+        loop = asyncio.get_running_loop()
+        for attempt in itertools.count():
+            try:
+                result = await pending.callback(*pending.args, **pending.kwargs)
+            except RetryAfter as exc:
+                if attempt >= self.max_retries or self._task is None:
+                    self._fail(pending, exc)
+                    return
+                self.retries += 1
+                logger.warning("Flood limit hit on %s, pausing %ss", pending.endpoint, exc.retry_after)
+                self._paused_until = max(self._paused_until, loop.time() + exc.retry_after)
+                await asyncio.sleep(self._paused_until - loop.time())
+            except Exception as exc:
+                self._fail(pending, exc)
+                return
+            else:
+                self.sent += 1
+                if not pending.future.done():
+                    pending.future.set_result(result)
+                return
+
+    @staticmethod
+    def _fail(pending: _Pending, exc: Exception) -> None:
+        if not pending.future.done():
+            pending.future.set_exception(exc)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "queued": len(self._queue),
+        }
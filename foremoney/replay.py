@@ -0,0 +1,92 @@
+"""Post recorded Telegram updates to a local webhook the way Telegram does.
+
+Updates are read from a ``getUpdates`` response, a JSON list or JSON lines
+and sent one by one with the ``X-Telegram-Bot-Api-Secret-Token`` header.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(path: Path) -> list[dict[str, Any]]:
+    text = Path(path).read_text()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        return data["result"] if "result" in data else [data]
+    return data
+
+
+def post_update(url: str, secret: str | None, update: dict[str, Any], timeout: float = 10) -> tuple[int, float]:
+    """Send one update; return the HTTP status and the response time.
+
+    Connection errors and timeouts are reported as status 0.
+    """
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers[SECRET_HEADER] = secret
+    request = urllib.request.Request(url, json.dumps(update).encode(), headers, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    except (OSError, http.client.HTTPException):
+        # refused, reset or timed out (URLError and TimeoutError included)
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def replay(url: str, secret: str | None, updates: list[dict[str, Any]], delay: float = 0) -> tuple[Counter, list[float]]:
+    statuses: Counter[int] = Counter()
+    times: list[float] = []
+    for update in updates:
+        status, seconds = post_update(url, secret, update)
+        statuses[status] += 1
+        times.append(seconds)
+        if delay:
+            time.sleep(delay)
+    return statuses, times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("updates", type=Path, help="recorded updates (JSON or JSON lines)")
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', '8443')}/"
+        f"{os.getenv('WEBHOOK_PATH', 'telegram').strip('/')}",
+        help="local webhook endpoint",
+    )
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET"), help="secret token")
+    parser.add_argument("--delay", type=float, default=0, help="seconds between updates")
+    args = parser.parse_args()
+    statuses, times = replay(args.url, args.secret, load_updates(args.updates), args.delay)
+    times.sort()
+    if not times:
+        print("no updates")
+        return
+    print(f"{len(times)} updates, statuses {dict(statuses)}")
+    print(
+        f"response p50 {times[len(times) // 2] * 1000:.1f} ms, "
+        f"p95 {times[min(len(times) - 1, int(0.95 * len(times)))] * 1000:.1f} ms, "
+        f"max {times[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
-    ReplyKeyboardRemove,
-    KeyboardButton,
 )
 from telegram.ext import ContextTypes, ConversationHandler
 
-from .ui import items_reply_keyboard
+from .ui import REMOVE_KEYBOARD, items_reply_keyboard, reply_keyboard
+from .money import parse_amount
+from .transactions.helpers import make_labels, labels_map
 
 from .states import (
     AG_ADD_ACCOUNT_NAME,
@@ -16,26 +16,19 @@ from .states import (
     AG_ACCOUNTS,
 )
 
+ACCOUNT_MENU_KEYBOARD = reply_keyboard((("Rename",), ("Delete",), ("Back",), ("Cancel",)))
+
+
 class SettingsAccountsMixin:
     """Manage individual accounts."""
 
     def accounts_keyboard(self, user_id: int, group_id: int, udata: dict) -> ReplyKeyboardMarkup:
         accs = self.db.accounts_with_value(user_id, group_id)
-        labels = [
-            {"id": a["id"], "name": f"{a['name']} ({a['value']})"} for a in accs
-        ]
-        udata["ag_account_map"] = {lbl["name"]: lbl["id"] for lbl in labels}
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (group_id, user_id),
-        )
+        labels = make_labels(accs)
+        udata["ag_account_map"] = labels_map(labels)
+        type_name = self.db.account_group_type(user_id, group_id)
         extra: list[str] = []
-        if not row or row["type_name"] != "capital":
+        if type_name != "capital":
             extra.append("+ account")
         extra.extend(["Rename group", "Delete group", "Back", "Cancel"])
         return items_reply_keyboard(labels, extra, columns=2)
@@ -59,35 +52,19 @@ class SettingsAccountsMixin:
         context.user_data["account_id"] = aid
         await update.message.reply_text(
             "Account menu",
-            reply_markup=ReplyKeyboardMarkup(
-                [
-                    [KeyboardButton("Rename")],
-                    [KeyboardButton("Delete")],
-                    [KeyboardButton("Back")],
-                    [KeyboardButton("Cancel")],
-                ],
-                resize_keyboard=True,
-            ),
+            reply_markup=ACCOUNT_MENU_KEYBOARD,
         )
         return ACCOUNT_MENU
 
     async def acc_add_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         gid = context.user_data["group_id"]
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (gid, update.effective_user.id),
-        )
-        if row and row["type_name"] == "capital":
+        type_name = self.db.account_group_type(update.effective_user.id, gid)
+        if type_name == "capital":
             await update.message.reply_text("Cannot create accounts in capital type")
             keyboard = self.accounts_keyboard(update.effective_user.id, gid, context.user_data)
             await update.message.reply_text("Accounts:", reply_markup=keyboard)
             return AG_ACCOUNTS
-        await update.message.reply_text("Enter account name", reply_markup=ReplyKeyboardRemove())
+        await update.message.reply_text("Enter account name", reply_markup=REMOVE_KEYBOARD)
         return AG_ADD_ACCOUNT_NAME
 
     async def acc_add_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -114,77 +91,14 @@ class SettingsAccountsMixin:
             context.user_data.clear()
             return ConversationHandler.END
         try:
-            value = float(text)
+            value = parse_amount(text)
         except ValueError:
             await update.message.reply_text("Please enter a number")
             return AG_ADD_ACCOUNT_VALUE
         aid = context.user_data.pop("new_account_id")
         gid = context.user_data["group_id"]
         user_id = update.effective_user.id
-        if value != 0:
-            row = self.db.fetchone(
-                """
-                SELECT g.name AS group_name, t.name AS type_name
-                FROM account_groups g
-                JOIN account_types t ON g.type_id=t.id
-                WHERE g.id=? AND g.user_id=?
-                """,
-                (gid, user_id),
-            )
-            if row:
-                gname = row["group_name"]
-                tname = row["type_name"]
-                if tname == "assets":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='assets' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, cap["id"], aid, value)
-                elif tname == "liabilities":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='liabilities' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, aid, cap["id"], value)
-                elif tname == "expenditures":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='expenditures' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, cap["id"], aid, value)
-                elif tname == "income":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='income' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, aid, cap["id"], value)
-                elif tname == "capital":
-                    cap_id = self.db.correction_account(user_id)
-                    self.db.add_transaction(user_id, aid, cap_id, value)
+        await self.writes.submit(user_id, "add_opening_balance", aid, gid, value)
         keyboard = self.accounts_keyboard(user_id, gid, context.user_data)
         await update.message.reply_text(
             "Account added",
@@ -193,7 +107,7 @@ class SettingsAccountsMixin:
         return AG_ACCOUNTS
 
     async def account_rename_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        await update.message.reply_text("Enter new name", reply_markup=ReplyKeyboardRemove())
+        await update.message.reply_text("Enter new name", reply_markup=REMOVE_KEYBOARD)
         return ACCOUNT_RENAME
 
     async def account_rename(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -243,11 +157,13 @@ class SettingsAccountsMixin:
         return AG_ACCOUNTS
 
     async def _delete_account(self, user_id: int, account_id: int) -> None:
-        bal = self.db.account_balance(user_id, account_id)
-        if bal != 0:
-            corr = self.db.correction_account(user_id)
-            if bal > 0:
-                self.db.add_transaction(user_id, account_id, corr, bal)
-            else:
-                self.db.add_transaction(user_id, corr, account_id, -bal)
-        self.db.archive_account(user_id, account_id)
+        # the balance must not change between reading and zeroing it
+        async with self.writes.exclusive(user_id):
+            bal = self.db.account_balance(user_id, account_id)
+            if bal != 0:
+                corr = self.db.correction_account(user_id)
+                if bal > 0:
+                    self.db.add_transaction(user_id, account_id, corr, bal)
+                else:
+                    self.db.add_transaction(user_id, corr, account_id, -bal)
+            self.db.archive_account(user_id, account_id)
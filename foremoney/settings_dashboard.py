@@ -1,40 +1,33 @@
 from telegram import (
     Update,
-    InlineKeyboardButton,
     InlineKeyboardMarkup,
     ReplyKeyboardMarkup,
-    KeyboardButton,
     InputFile,
 )
 from telegram.ext import ContextTypes, ConversationHandler
+import asyncio
+from datetime import datetime
 from io import BytesIO
 
-from .states import SETTINGS_MENU, DASHBOARD_ACCOUNTS, IMPORT_WAIT_FILE
-from .database import Database, export_archive, import_archive
+from .rate_limiter import BULK
+from .states import SETTINGS_MENU, DASHBOARD_ACCOUNTS, IMPORT_WAIT_FILE, CLOSE_PERIOD_DATE
 from .init_data import seed
+from .ui import inline_keyboard, reply_keyboard
+
+SETTINGS_MENU_KEYBOARD = reply_keyboard((
+    ("Dashboard accounts", "Accounts"),
+    ("Add family", "Recreate database"),
+    ("Export data", "Import data"),
+    ("Close period", "Menu balances"),
+    ("Back",),
+))
+
 
 class SettingsDashboardMixin:
     """Manage dashboard accounts and database."""
 
     def settings_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [
-                KeyboardButton("Dashboard accounts"),
-                KeyboardButton("Accounts"),
-            ],
-            [
-                KeyboardButton("Add family"),
-                KeyboardButton("Recreate database"),
-            ],
-            [
-                KeyboardButton("Export data"),
-                KeyboardButton("Import data"),
-            ],
-            [
-                KeyboardButton("Back"),
-            ],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return SETTINGS_MENU_KEYBOARD
 
     async def start_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text(
@@ -56,6 +49,10 @@ class SettingsDashboardMixin:
             return await self.export_data(update, context)
         if text == "Import data":
             return await self.import_data_prompt(update, context)
+        if text == "Close period":
+            return await self.close_period_prompt(update, context)
+        if text == "Menu balances":
+            return await self.toggle_nav_values(update, context)
         if text == "Back":
             await update.message.reply_text(
                 "Back to menu", reply_markup=self.main_menu_keyboard()
@@ -64,16 +61,30 @@ class SettingsDashboardMixin:
         await update.message.reply_text("Use menu", reply_markup=self.settings_menu_keyboard())
         return SETTINGS_MENU
 
+    def nav_values(self, user_id: int) -> bool:
+        """Whether the transaction wizard shows balances on its buttons."""
+        return self.db.get_setting(user_id, f"nav_values:{user_id}") != "0"
+
+    async def toggle_nav_values(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user_id = update.effective_user.id
+        show = not self.nav_values(user_id)
+        await self.writes.submit(user_id, "set_setting", f"nav_values:{user_id}", "1" if show else "0")
+        await update.message.reply_text(
+            f"Balances in transaction menus: {'on' if show else 'off'}",
+            reply_markup=self.settings_menu_keyboard(),
+        )
+        return SETTINGS_MENU
+
     def dashboard_accounts_keyboard(self, user_id: int, selected: set[int]) -> InlineKeyboardMarkup:
         accounts = self.db.all_accounts(user_id)
-        buttons = []
+        rows = []
         for acc in accounts:
             prefix = "\u2714 " if acc["id"] in selected else ""
             label = f"{prefix}{acc['group_name']}: {acc['name']}"
-            buttons.append([InlineKeyboardButton(label, callback_data=f"dashacc:{acc['id']}")])
-        buttons.append([InlineKeyboardButton("Save", callback_data="dashsave")])
-        buttons.append([InlineKeyboardButton("Cancel", callback_data="dashcancel")])
-        return InlineKeyboardMarkup(buttons)
+            rows.append(((label, f"dashacc:{acc['id']}"),))
+        rows.append((("Save", "dashsave"),))
+        rows.append((("Cancel", "dashcancel"),))
+        return inline_keyboard(tuple(rows))
 
     async def start_dashboard_accounts(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.effective_user.id
@@ -107,7 +118,7 @@ class SettingsDashboardMixin:
         user_id = update.effective_user.id
         selected: set[int] = context.user_data.get("dash_sel", set())
         val = ",".join(str(v) for v in selected)
-        self.db.set_setting(user_id, "dashboard_accounts", val)
+        await self.writes.submit(user_id, "set_setting", "dashboard_accounts", val)
         await query.message.reply_text("Saved", reply_markup=self.settings_menu_keyboard())
         return SETTINGS_MENU
 
@@ -127,18 +138,22 @@ class SettingsDashboardMixin:
 
     async def recreate_database(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.effective_user.id
-        self.db.conn.close()
-        if self.settings.database_path.exists():
-            self.settings.database_path.unlink()
-        self.db = Database(self.settings.database_path)
-        seed(self.db, self.db.family_id(user_id))
+        async with self.writes.exclusive(user_id):
+            self.db.recreate(user_id)
+            seed(self.db, self.db.family_id(user_id))
         await update.message.reply_text("Database recreated")
         return SETTINGS_MENU
 
     async def export_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        data = export_archive(self.settings.database_path)
-        await update.message.reply_document(
-            InputFile(BytesIO(data), filename="foremoney_export.zip")
+        user_id = update.effective_user.id
+        # the export reads a snapshot on its own connection off the event loop
+        data = await asyncio.to_thread(
+            self.db.shard_for(user_id).export_data, self.db.family_id(user_id)
+        )
+        await context.bot.send_document(
+            update.effective_chat.id,
+            InputFile(BytesIO(data), filename="foremoney_export.zip"),
+            rate_limit_args=BULK,
         )
         return SETTINGS_MENU
 
@@ -157,9 +172,30 @@ class SettingsDashboardMixin:
         buf = BytesIO()
         await file.download_to_memory(buf)
         buf.seek(0)
-        import_archive(self.settings.database_path, buf.getvalue())
-        self.db = Database(self.settings.database_path)
+        async with self.writes.exclusive(update.effective_user.id):
+            self.db.import_data(update.effective_user.id, buf.getvalue())
         await update.message.reply_text(
             "Database imported", reply_markup=self.settings_menu_keyboard()
         )
         return SETTINGS_MENU
+
+    async def close_period_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        await update.message.reply_text(
+            "Enter first date of the open period YYYY-MM-DD. Older transactions "
+            "are archived and balances carried forward through Corrections."
+        )
+        return CLOSE_PERIOD_DATE
+
+    async def close_period_date(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        text = update.message.text.strip()
+        try:
+            datetime.fromisoformat(text)
+        except ValueError:
+            await update.message.reply_text("Invalid date format")
+            return CLOSE_PERIOD_DATE
+        async with self.writes.exclusive(update.effective_user.id):
+            moved = self.db.close_period(update.effective_user.id, text)
+        await update.message.reply_text(
+            f"Archived {moved} transactions", reply_markup=self.settings_menu_keyboard()
+        )
+        return SETTINGS_MENU
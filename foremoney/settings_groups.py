@@ -1,13 +1,12 @@
 from telegram import (
     Update,
     ReplyKeyboardMarkup,
-    ReplyKeyboardRemove,
 )
 from telegram.ext import ContextTypes, ConversationHandler
 
 from .init_data import seed
 
-from .ui import items_reply_keyboard
+from .ui import REMOVE_KEYBOARD, items_reply_keyboard
 from .transactions.helpers import make_labels, labels_map
 from .states import (
     SETTINGS_MENU,
@@ -63,7 +62,7 @@ class SettingsGroupsMixin:
         return AG_GROUPS
 
     async def ag_add_group_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        await update.message.reply_text("Enter group name", reply_markup=ReplyKeyboardRemove())
+        await update.message.reply_text("Enter group name", reply_markup=REMOVE_KEYBOARD)
         return AG_ADD_GROUP_NAME
 
     async def ag_add_group_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -147,7 +146,7 @@ class SettingsGroupsMixin:
         return AG_GROUPS
 
     async def grename_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        await update.message.reply_text("Enter new group name", reply_markup=ReplyKeyboardRemove())
+        await update.message.reply_text("Enter new group name", reply_markup=REMOVE_KEYBOARD)
         return AG_GROUP_RENAME
 
     async def grename(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from .constants import ACCOUNT_TYPES
+from .database import Database
+from .storage import Storage, file_sizes
+from .tracing import QueryTracer
+
+# Tables whose rows belong to a single family through their ``user_id`` column.
+FAMILY_TABLES = (
+    "account_groups", "accounts", "transactions", "transactions_archive", "settings",
+)
+# Tables owned by the directory file; shards only keep a copy of the types.
+DIRECTORY_TABLES = ("account_types", "family_invites", "user_family")
+
+
+def shard_path(shard_dir: Path, family_id: int) -> Path:
+    return Path(shard_dir) / f"family_{family_id}.sqlite3"
+
+
+class ShardedDatabase:
+    """Route ``Database`` calls to per-family SQLite files.
+
+    The main database file acts as a directory holding ``user_family``,
+    ``family_invites`` and the shared ``account_types``. Every other call
+    whose first argument is a ``user_id`` is forwarded to the shard of the
+    user's family, so writes of different families never share a file lock.
+    """
+
+    def __init__(
+        self, directory_path: Path, shard_dir: Path, tracer: QueryTracer | None = None
+    ) -> None:
+        self.path = Path(directory_path)
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.tracer = tracer
+        self.directory = Database(self.path, tracer)
+        for atype in ACCOUNT_TYPES:
+            self.directory.add_account_type(atype)
+        self.shards: dict[int, Database] = {}
+
+    # ---- routing ----
+
+    def _open_shard(self, family_id: int) -> Database:
+        shard = Database(shard_path(self.shard_dir, family_id), self.tracer)
+        # account type ids must match across shards and the directory
+        cur = shard.conn.executemany(
+            "INSERT OR IGNORE INTO account_types (id, name) VALUES (?, ?)",
+            [(t["id"], t["name"]) for t in self.directory.account_types()],
+        )
+        shard.conn.commit()
+        shard._rows_changed("account_types", cur.rowcount)
+        return shard
+
+    def _shard(self, family_id: int) -> Database:
+        shard = self.shards.get(family_id)
+        if shard is None:
+            shard = self.shards[family_id] = self._open_shard(family_id)
+        return shard
+
+    def shard_for(self, user_id: int) -> Database:
+        return self._shard(self.family_id(user_id))
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(Database, name, None)
+        if not callable(method):
+            raise AttributeError(name)
+
+        def routed(user_id: int, *args: Any, **kwargs: Any) -> Any:
+            family_id = self.family_id(user_id)
+            return getattr(self._shard(family_id), name)(family_id, *args, **kwargs)
+
+        return routed
+
+    # ---- directory level operations ----
+
+    def family_id(self, user_id: int) -> int:
+        return self.directory.family_id(user_id)
+
+    def rebuild_balance_snapshots(self, user_id: int | None = None) -> None:
+        if user_id is not None:
+            self.shard_for(user_id).rebuild_balance_snapshots()
+            return
+        for family_id in self.family_ids():
+            self._shard(family_id).rebuild_balance_snapshots()
+
+    def create_family_invite(self, family_id: int) -> str:
+        return self.directory.create_family_invite(family_id)
+
+    def use_family_invite(self, token: str, user_id: int) -> bool:
+        return self.directory.use_family_invite(token, user_id)
+
+    def account_types(self):
+        return self.directory.account_types()
+
+    def add_account_type(self, name: str) -> None:
+        self.directory.add_account_type(name)
+
+    def account_type_id(self, name: str) -> int | None:
+        return self.directory.account_type_id(name)
+
+    # ---- storage location ----
+
+    def paths(self) -> list[Path]:
+        return [self.path, *sorted(self.shard_dir.glob("family_*.sqlite3"))]
+
+    def family_ids(self) -> list[int]:
+        """Return the families of every shard file, open or not."""
+        return sorted(int(p.stem.removeprefix("family_")) for p in self.paths()[1:])
+
+    def stats(self) -> dict[str, Any]:
+        """Sum file sizes of all shards and row counts and caches of open ones.
+
+        Rows are counted from the directory's own tables and the family
+        tables of the shards: ``split_database`` leaves the migrated rows in
+        the directory file, where they would otherwise be counted twice.
+        """
+        db_bytes, wal_bytes = file_sizes(self.paths())
+        rows: Counter[str] = Counter()
+        hits: Counter[str] = Counter()
+        misses: Counter[str] = Counter()
+        for db in (self.directory, *list(self.shards.values())):
+            stats = db.stats()
+            own = db is self.directory
+            rows.update({
+                table: count for table, count in stats["rows"].items()
+                if (table in DIRECTORY_TABLES) == own
+            })
+            for name, (hit, miss) in stats["caches"].items():
+                hits[name] += hit
+                misses[name] += miss
+        return {
+            "db_bytes": db_bytes,
+            "wal_bytes": wal_bytes,
+            "rows": dict(sorted(rows.items())),
+            "caches": {name: (hits[name], misses[name]) for name in sorted(hits)},
+        }
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.close()
+        self.shards.clear()
+        self.directory.close()
+
+    def recreate(self, user_id: int) -> None:
+        """Drop the data of the user's family only."""
+        family_id = self.family_id(user_id)
+        self._shard(family_id).recreate(family_id)
+        self.shards.pop(family_id).close()
+
+    def import_data(self, user_id: int, data: bytes) -> None:
+        family_id = self.family_id(user_id)
+        self._shard(family_id).import_data(family_id, data)
+        self.shards.pop(family_id).close()
+
+
+Storage.register(ShardedDatabase)
+
+
+def split_database(source: Path, shard_dir: Path) -> list[Path]:
+    """Copy every family's rows from a single-file database into shards.
+
+    The source file is left untouched and keeps serving as the directory
+    database of the sharded setup.
+    """
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    Database(Path(source)).close()  # make sure the source schema is current
+    src = sqlite3.connect(source)
+    src.row_factory = sqlite3.Row
+    families: set[int] = set()
+    for table in FAMILY_TABLES:
+        families.update(r[0] for r in src.execute(f"SELECT DISTINCT user_id FROM {table}"))
+    types = src.execute("SELECT id, name FROM account_types").fetchall()
+    created = []
+    for family_id in sorted(families):
+        path = shard_path(shard_dir, family_id)
+        if path.exists():
+            raise FileExistsError(path)
+        shard = Database(path)
+        shard.conn.executemany(
+            "INSERT OR REPLACE INTO account_types (id, name) VALUES (?, ?)",
+            [tuple(t) for t in types],
+        )
+        for table in FAMILY_TABLES:
+            cur = src.execute(f"SELECT * FROM {table} WHERE user_id=?", (family_id,))
+            cols = [d[0] for d in cur.description]
+            placeholders = ",".join("?" * len(cols))
+            shard.conn.executemany(
+                f"INSERT INTO {table} ({','.join(cols)}) VALUES ({placeholders})",
+                [tuple(r) for r in cur],
+            )
+        shard.conn.commit()
+        shard.close()
+        created.append(path)
+    src.close()
+    return created
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Split a single ForeMoney database into per-family shards."
+    )
+    parser.add_argument("source", type=Path, help="existing database file")
+    parser.add_argument("shard_dir", type=Path, help="directory for shard files")
+    args = parser.parse_args()
+    for path in split_database(args.source, args.shard_dir):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,4 +38,5 @@
     TX_FILTER_GROUP,
     TX_FILTER_ACCOUNT,
     IMPORT_WAIT_FILE,
-) = range(38)
+    CLOSE_PERIOD_DATE,
+) = range(39)
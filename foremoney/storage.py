@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Sequence
+
+from .constants import NEGATIVE_TYPES
+from .name_index import NameIndex
+from .pair_index import PairIndex
+
+Row = Mapping[str, Any]
+
+
+def signed_value(type_name: str | None, balance: int) -> int:
+    """Return account value for a raw balance according to the account type."""
+    if type_name in NEGATIVE_TYPES:
+        return -balance
+    return balance
+
+
+def file_sizes(paths: Iterable[Path]) -> tuple[int, int]:
+    """Return the total size of the database files and of their WAL files."""
+    db_bytes = wal_bytes = 0
+    for path in paths:
+        for suffix in ("", "-wal"):
+            try:
+                size = Path(f"{path}{suffix}").stat().st_size
+            except OSError:
+                continue
+            if suffix:
+                wal_bytes += size
+            else:
+                db_bytes += size
+    return db_bytes, wal_bytes
+
+
+class Storage(ABC):
+    """Operations the bot handlers need from a storage backend.
+
+    Backends implement the primitive lookups and writes; business rules
+    such as value signs, rollups and the Corrections account live here and
+    are shared by all backends. All amounts, balances and values are integer
+    minor units (see :mod:`foremoney.money`).
+    """
+
+    # ---- storage location ----
+
+    def shard_for(self, user_id: int) -> "Storage":
+        """Return the storage holding data of the user's family."""
+        return self
+
+    def paths(self) -> list[Path]:
+        """Return all database files backing this storage."""
+        return []
+
+    def family_ids(self) -> list[int]:
+        """Return ids of the families with derived data to maintain."""
+        return []
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        """Return file sizes, row counts and cache ``(hits, misses)``."""
+        db_bytes, wal_bytes = file_sizes(self.paths())
+        return {"db_bytes": db_bytes, "wal_bytes": wal_bytes, "rows": {}, "caches": {}}
+
+    @contextmanager
+    def batch(self):
+        """Group the writes of the block into one commit where supported."""
+        yield
+
+    @contextmanager
+    def atomic(self):
+        """Make the writes of the block all-or-nothing where supported."""
+        yield
+
+    @abstractmethod
+    def recreate(self, user_id: int) -> None:
+        """Drop all data and create an empty schema."""
+
+    @abstractmethod
+    def export_data(self, user_id: int) -> bytes:
+        ...
+
+    @abstractmethod
+    def import_data(self, user_id: int, data: bytes) -> None:
+        ...
+
+    # ---- families ----
+
+    @abstractmethod
+    def family_id(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def create_family_invite(self, family_id: int) -> str:
+        ...
+
+    @abstractmethod
+    def use_family_invite(self, token: str, user_id: int) -> bool:
+        ...
+
+    # ---- account types, groups and accounts ----
+
+    @abstractmethod
+    def account_types(self) -> Iterable[Row]:
+        ...
+
+    @abstractmethod
+    def add_account_type(self, name: str) -> None:
+        """Create an account type unless it already exists."""
+
+    @abstractmethod
+    def account_type_id(self, name: str) -> int | None:
+        ...
+
+    @abstractmethod
+    def account_groups(self, user_id: int, type_id: int) -> Iterable[Row]:
+        ...
+
+    @abstractmethod
+    def find_account_group(self, user_id: int, type_id: int, name: str) -> int | None:
+        ...
+
+    @abstractmethod
+    def account_group_info(self, user_id: int, group_id: int) -> Row | None:
+        """Return group name and type name of an account group."""
+
+    @abstractmethod
+    def add_account_group(self, user_id: int, type_id: int, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def update_account_group_name(self, user_id: int, group_id: int, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def archive_account_group(self, user_id: int, group_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def accounts(self, user_id: int, group_id: int) -> Iterable[Row]:
+        ...
+
+    @abstractmethod
+    def all_accounts(self, user_id: int, include_archived: bool = False) -> Iterable[Row]:
+        ...
+
+    @abstractmethod
+    def find_account(self, user_id: int, group_id: int, name: str) -> int | None:
+        ...
+
+    @abstractmethod
+    def account_type_name(self, user_id: int, account_id: int) -> str | None:
+        ...
+
+    @abstractmethod
+    def name_index(self, user_id: int) -> NameIndex:
+        """Return the family's accounts indexed by account and group names."""
+
+    @abstractmethod
+    def add_account(self, user_id: int, group_id: int, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def update_account_name(self, user_id: int, account_id: int, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def archive_account(self, user_id: int, account_id: int) -> None:
+        ...
+
+    # ---- transactions ----
+
+    @abstractmethod
+    def add_transaction(
+        self,
+        user_id: int,
+        from_id: int,
+        to_id: int,
+        amount: int,
+        ts: str | None = None,
+    ) -> int:
+        ...
+
+    def add_transactions(self, user_id: int, rows: Iterable[Sequence]) -> list[int]:
+        """Insert ``(from_id, to_id, amount, ts)`` rows and return their ids."""
+        return [self.add_transaction(user_id, *row) for row in rows]
+
+    @abstractmethod
+    def transactions(
+        self,
+        user_id: int,
+        limit: int,
+        offset: int,
+        filters: dict | None = None,
+    ) -> Iterable[Row]:
+        ...
+
+    @abstractmethod
+    def transaction(self, user_id: int, tx_id: int, archived: bool = False) -> Row | None:
+        ...
+
+    @abstractmethod
+    def delete_transaction(self, user_id: int, tx_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def update_transaction_amount(self, user_id: int, tx_id: int, amount: int) -> None:
+        ...
+
+    @abstractmethod
+    def close_period(self, user_id: int, before: str) -> int:
+        """Archive transactions dated before ``before`` and carry balances forward.
+
+        Every account's balance over the archived rows is posted as an
+        opening transaction against :meth:`correction_account` at the first
+        second of ``before``. The ``archived`` list filter and
+        ``transaction(..., archived=True)`` read the archived rows. Returns
+        the number of archived transactions.
+        """
+
+    @abstractmethod
+    def pair_index(self, user_id: int) -> PairIndex:
+        """Return recency-weighted counts of the family's account pairs."""
+
+    @abstractmethod
+    def account_balance(self, user_id: int, account_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def balance_as_of(self, user_id: int, account_id: int, ts) -> int:
+        """Return account balance after all transactions up to ``ts``."""
+
+    @abstractmethod
+    def group_balance_as_of(self, user_id: int, group_id: int, ts) -> int:
+        ...
+
+    @abstractmethod
+    def type_balance_as_of(self, user_id: int, type_id: int, ts) -> int:
+        ...
+
+    def rebuild_balance_snapshots(self, user_id: int | None = None) -> None:
+        """Recompute derived historical balances from transactions."""
+
+    def rebuild_family_snapshots(self, family_id: int) -> None:
+        """Like :meth:`rebuild_balance_snapshots`, callable from a worker thread."""
+
+    @abstractmethod
+    def account_type_history(self, user_id: int, type_id: int) -> list[tuple[int, int]]:
+        """Return ``(day, balance)`` closing balances of an account type."""
+
+    @abstractmethod
+    def account_group_history(self, user_id: int, group_id: int) -> list[tuple[int, int]]:
+        """Return ``(day, balance)`` closing balances of an account group."""
+
+    # ---- settings ----
+
+    @abstractmethod
+    def set_setting(self, user_id: int, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_setting(self, user_id: int, key: str) -> str | None:
+        ...
+
+    # ---- business rules shared by all backends ----
+
+    def account_group_type(self, user_id: int, group_id: int) -> str | None:
+        """Return account type name of a group."""
+        row = self.account_group_info(user_id, group_id)
+        return row["type_name"] if row else None
+
+    def account_value(self, user_id: int, account_id: int) -> int:
+        """Return account value based on its type."""
+        user_id = self.family_id(user_id)
+        bal = self.account_balance(user_id, account_id)
+        return signed_value(self.account_type_name(user_id, account_id), bal)
+
+    def account_type_dynamics(self, user_id: int, type_id: int) -> list[tuple[int, int]]:
+        """Return ``(day, value)`` points of an account type's value."""
+        names = {t["id"]: t["name"] for t in self.account_types()}
+        return [
+            (day, signed_value(names.get(type_id), bal))
+            for day, bal in self.account_type_history(user_id, type_id)
+        ]
+
+    def account_group_dynamics(self, user_id: int, group_id: int) -> list[tuple[int, int]]:
+        """Return ``(day, value)`` points of an account group's value."""
+        type_name = self.account_group_type(user_id, group_id)
+        return [
+            (day, signed_value(type_name, bal))
+            for day, bal in self.account_group_history(user_id, group_id)
+        ]
+
+    def account_type_names(self, user_id: int) -> Iterable[Row]:
+        """Return account types by name only, without computing values."""
+        return self.account_types()
+
+    def account_group_names(self, user_id: int, type_id: int) -> Iterable[Row]:
+        """Return account groups by name only, without computing values."""
+        return self.account_groups(user_id, type_id)
+
+    def account_names(self, user_id: int, group_id: int) -> Iterable[Row]:
+        """Return accounts by name only, without computing values."""
+        return self.accounts(user_id, group_id)
+
+    def accounts_with_value(self, user_id: int, group_id: int):
+        """Return accounts list with calculated values."""
+        user_id = self.family_id(user_id)
+        accs = self.accounts(user_id, group_id)
+        result = []
+        for a in accs:
+            val = self.account_value(user_id, a["id"])
+            result.append({"id": a["id"], "name": a["name"], "value": val})
+        return result
+
+    def account_group_value(self, user_id: int, group_id: int) -> int:
+        """Return total value of all accounts within a group."""
+        user_id = self.family_id(user_id)
+        total = 0
+        for acc in self.accounts(user_id, group_id):
+            total += self.account_value(user_id, acc["id"])
+        return total
+
+    def account_groups_with_value(self, user_id: int, type_id: int):
+        """Return account groups list with calculated values."""
+        user_id = self.family_id(user_id)
+        groups = self.account_groups(user_id, type_id)
+        result = []
+        for g in groups:
+            val = self.account_group_value(user_id, g["id"])
+            result.append({"id": g["id"], "name": g["name"], "value": val})
+        return result
+
+    def account_type_value(self, user_id: int, type_id: int) -> int:
+        """Return total value of all accounts within a type."""
+        user_id = self.family_id(user_id)
+        total = 0
+        for g in self.account_groups(user_id, type_id):
+            total += self.account_group_value(user_id, g["id"])
+        return total
+
+    def account_types_with_value(self, user_id: int):
+        """Return account types list with calculated values."""
+        user_id = self.family_id(user_id)
+        types = self.account_types()
+        result = []
+        for t in types:
+            val = self.account_type_value(user_id, t["id"])
+            result.append({"id": t["id"], "name": t["name"], "value": val})
+        return result
+
+    def frequent_pairs(self, user_id: int, limit: int = 4) -> list[dict[str, Any]]:
+        """Return the most used (from, to) pairs of live, non-capital accounts.
+
+        Names are ``"group: account"`` labels of :class:`NameIndex`, so
+        same-named accounts of different groups stay apart.
+        """
+        user_id = self.family_id(user_id)
+        labels = self.name_index(user_id).labels
+        result = []
+        # a few spare candidates make up for archived and capital ones
+        for from_id, to_id in self.pair_index(user_id).top(limit * 2 + 4):
+            if from_id not in labels or to_id not in labels or from_id == to_id:
+                continue
+            result.append({
+                "from_account": from_id,
+                "to_account": to_id,
+                "from_name": labels[from_id],
+                "to_name": labels[to_id],
+            })
+            if len(result) == limit:
+                break
+        return result
+
+    def accounts_balance(self, user_id: int, account_ids: Iterable[int]) -> int:
+        user_id = self.family_id(user_id)
+        total = 0
+        for aid in account_ids:
+            total += self.account_balance(user_id, aid)
+        return total
+
+    def capital_account(self, user_id: int, group_name: str, account_name: str) -> int | None:
+        """Return id of a capital account by its group and account names."""
+        user_id = self.family_id(user_id)
+        type_id = self.account_type_id("capital")
+        if type_id is None:
+            return None
+        gid = self.find_account_group(user_id, type_id, group_name)
+        if gid is None:
+            return None
+        return self.find_account(user_id, gid, account_name)
+
+    def correction_account(self, user_id: int) -> int:
+        """Return the default capital account used for corrections."""
+        user_id = self.family_id(user_id)
+        type_id = self.account_type_id("capital")
+        gid = self.find_account_group(user_id, type_id, "Corrections")
+        if gid is None:
+            gid = self.add_account_group(user_id, type_id, "Corrections")
+        else:
+            accs = list(self.accounts(user_id, gid))
+            if accs:
+                return min(a["id"] for a in accs)
+        return self.add_account(user_id, gid, "Default")
+
+    def add_opening_balance(self, user_id: int, account_id: int, group_id: int, value: int) -> None:
+        """Post the initial value of a new account against its capital account."""
+        if value == 0:
+            return
+        row = self.account_group_info(user_id, group_id)
+        if not row:
+            return
+        gname = row["group_name"]
+        tname = row["type_name"]
+        if tname == "capital":
+            self.add_transaction(user_id, account_id, self.correction_account(user_id), value)
+            return
+        cap = self.capital_account(user_id, tname, gname)
+        if cap is None:
+            return
+        if tname in NEGATIVE_TYPES:
+            self.add_transaction(user_id, account_id, cap, value)
+        else:
+            self.add_transaction(user_id, cap, account_id, value)
+
+
+def open_storage(settings, tracer=None) -> Storage:
+    """Create the storage backend selected in ``settings``.
+
+    ``tracer`` is a :class:`~foremoney.tracing.QueryTracer` attached to
+    SQLite connections.
+    """
+    if settings.storage_backend == "memory":
+        from .memory_db import MemoryDatabase
+
+        return MemoryDatabase()
+    if settings.shard_dir:
+        from .sharding import ShardedDatabase
+
+        return ShardedDatabase(settings.database_path, settings.shard_dir, tracer)
+    from .database import Database
+
+    return Database(settings.database_path, tracer)
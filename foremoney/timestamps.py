@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import calendar
+from datetime import date, datetime, timedelta, timezone
+
+# Transaction timestamps are naive "YYYY-MM-DD HH:MM:SS" strings, the format
+# of SQLite's CURRENT_TIMESTAMP. ``ts_epoch`` stores the same wall-clock time
+# as integer seconds so range filters and ordering can use an index.
+
+DAY = 86400
+
+
+def now_text() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def to_epoch(ts: str | datetime | date) -> int:
+    """Return integer seconds for a timestamp or date treated as UTC."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if not isinstance(ts, datetime):
+        ts = datetime(ts.year, ts.month, ts.day)
+    return calendar.timegm(ts.timetuple())
+
+
+def epoch_day(epoch: int) -> int:
+    """Return the epoch of the first second of the day containing ``epoch``."""
+    return epoch - epoch % DAY
+
+
+def day_start(value: str) -> int:
+    """Return the epoch of the first second of the day given in ``value``."""
+    return to_epoch(datetime.fromisoformat(str(value)).date())
+
+
+def day_start_text(value: str) -> str:
+    """Return the first second of the day given in ``value`` as timestamp text."""
+    return f"{datetime.fromisoformat(str(value)).date()} 00:00:00"
+
+
+def day_end(value: str) -> int:
+    """Return the epoch of the first second after the day given in ``value``."""
+    return to_epoch(datetime.fromisoformat(str(value)).date() + timedelta(days=1))
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(sql: str) -> str:
+    """Return ``sql`` with literals replaced by ``?`` and whitespace collapsed."""
+    return _SPACES.sub(" ", _LITERALS.sub("?", sql)).strip()
+
+
+class UpdateTrace:
+    """Statements executed while one Telegram update was processed."""
+
+    __slots__ = ("update_id", "statements", "db_time", "shapes")
+
+    def __init__(self, update_id: Any = None) -> None:
+        self.update_id = update_id
+        self.statements = 0
+        self.db_time = 0.0
+        self.shapes: Counter[str] = Counter()
+
+
+current_trace: ContextVar[UpdateTrace | None] = ContextVar("current_trace", default=None)
+
+
+class QueryTracer:
+    """Per-update SQL statement counts, DB time and an N+1 detector.
+
+    ``Database`` installs :meth:`on_statement` with
+    ``Connection.set_trace_callback`` and reports the time spent in its
+    ``execute``/``fetchall``/``fetchone`` wrappers to :meth:`add_time`. Both
+    only record while an update is being traced.
+    """
+
+    def __init__(self, repeat_threshold: int = 20, top: int = 3) -> None:
+        self.repeat_threshold = repeat_threshold
+        self.top = top
+        self.updates = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.n_plus_one = 0
+        self.last: UpdateTrace | None = None
+
+    def on_statement(self, sql: str) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.statements += 1
+            trace.shapes[statement_shape(sql)] += 1
+
+    def add_time(self, seconds: float) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.db_time += seconds
+
+    def begin(self, update_id: Any = None):
+        return current_trace.set(UpdateTrace(update_id))
+
+    def end(self, token) -> UpdateTrace:
+        trace = current_trace.get()
+        current_trace.reset(token)
+        self.updates += 1
+        self.statements += trace.statements
+        self.db_time += trace.db_time
+        self.last = trace
+        top = trace.shapes.most_common(self.top)
+        logger.debug(
+            "update %s: %d statements, %.1f ms in DB, top shapes %s",
+            trace.update_id, trace.statements, trace.db_time * 1000, top,
+        )
+        if top and top[0][1] > self.repeat_threshold:
+            self.n_plus_one += 1
+            logger.warning(
+                "update %s repeated one statement %d times (%d statements, "
+                "%.1f ms in DB): %s",
+                trace.update_id, top[0][1], trace.statements,
+                trace.db_time * 1000, top[0][0],
+            )
+        return trace
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "updates": self.updates,
+            "statements": self.statements,
+            "db_time": self.db_time,
+            "n_plus_one": self.n_plus_one,
+        }
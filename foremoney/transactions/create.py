@@ -1,14 +1,9 @@
-from telegram import (
-    Update,
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    ReplyKeyboardRemove,
-    ReplyKeyboardMarkup,
-    KeyboardButton,
-)
+from typing import Iterable
+
+from telegram import ReplyKeyboardMarkup, Update
 from telegram.ext import ContextTypes, ConversationHandler
 
-from ..ui import items_reply_keyboard
+from ..ui import REMOVE_KEYBOARD, items_reply_keyboard, reply_keyboard
 from ..init_data import seed
 from ..states import (
     FROM_TYPE,
@@ -23,20 +18,62 @@ from ..states import (
     TX_DATETIME,
 )
 from .helpers import make_labels, labels_map, format_transaction
+from ..money import parse_amount
+
+AMOUNT_KEYBOARD = reply_keyboard((("Back", "Cancel"),))
+DATETIME_KEYBOARD = reply_keyboard((("Now", "Back", "Cancel"),))
+SHORTCUTS = 4
+
+
+def start_keyboard(shortcuts: Iterable[str], type_labels: list) -> ReplyKeyboardMarkup:
+    """Frequent pairs one per row above the account types."""
+    rows = [(label,) for label in shortcuts]
+    names = [str(item["name"]) for item in type_labels]
+    rows.extend(tuple(names[i:i + 2]) for i in range(0, len(names), 2))
+    rows.append(("Cancel",))
+    return reply_keyboard(tuple(rows))
+
 
 class TransactionCreateMixin:
     """Flow for creating a transaction."""
 
+    # Navigation keyboards show balances unless the user turned them off in
+    # settings; names alone come from the cached account directory and need
+    # no aggregate queries.
+
+    def type_labels(self, user_id: int, context: ContextTypes.DEFAULT_TYPE) -> list:
+        if not context.user_data.get("nav_values", True):
+            return self.db.account_type_names(user_id)
+        return make_labels(self.db.account_types_with_value(user_id))
+
+    def group_labels(self, user_id: int, type_id: int, context: ContextTypes.DEFAULT_TYPE) -> list:
+        if not context.user_data.get("nav_values", True):
+            return self.db.account_group_names(user_id, type_id)
+        return make_labels(self.db.account_groups_with_value(user_id, type_id))
+
+    def account_labels(self, user_id: int, group_id: int, context: ContextTypes.DEFAULT_TYPE) -> list:
+        if not context.user_data.get("nav_values", True):
+            return self.db.account_names(user_id, group_id)
+        return make_labels(self.db.accounts_with_value(user_id, group_id))
+
     async def start_create_transaction(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.effective_user.id
         family_id = self.db.family_id(user_id)
         seed(self.db, family_id)
-        types = self.db.account_types_with_value(user_id)
-        type_labels = make_labels(types)
+        context.user_data["nav_values"] = self.nav_values(user_id)
+        context.user_data.pop("shortcut", None)
+        # the most used pairs skip straight to the amount
+        shortcuts: dict[str, list[int]] = {}
+        for pair in self.db.frequent_pairs(user_id, SHORTCUTS):
+            label = f"{pair['from_name']} \u2192 {pair['to_name']}"
+            # equal labels keep the more frequent pair, never a mix of both
+            shortcuts.setdefault(label, [pair["from_account"], pair["to_account"]])
+        context.user_data["shortcut_map"] = shortcuts
+        type_labels = self.type_labels(user_id, context)
         context.user_data["from_type_map"] = labels_map(type_labels)
         await update.message.reply_text(
             "Select source account type",
-            reply_markup=items_reply_keyboard(type_labels, ["Cancel"], columns=2),
+            reply_markup=start_keyboard(shortcuts, type_labels),
         )
         return FROM_TYPE
 
@@ -47,6 +84,16 @@ class TransactionCreateMixin:
                 "Cancelled", reply_markup=self.main_menu_keyboard()
             )
             return ConversationHandler.END
+        shortcut = context.user_data.get("shortcut_map", {}).get(text)
+        if shortcut:
+            context.user_data["from_account"], context.user_data["to_account"] = shortcut
+            context.user_data["shortcut"] = True
+            context.user_data.pop("editing", None)
+            await update.message.reply_text(
+                "Enter amount, it is saved with the current time",
+                reply_markup=AMOUNT_KEYBOARD,
+            )
+            return AMOUNT
         type_map = context.user_data.get("from_type_map", {})
         if text not in type_map:
             await update.message.reply_text("Use provided buttons")
@@ -54,8 +101,7 @@ class TransactionCreateMixin:
         type_id = type_map[text]
         context.user_data["from_type"] = type_id
         user_id = update.effective_user.id
-        groups = self.db.account_groups_with_value(user_id, type_id)
-        group_labels = make_labels(groups)
+        group_labels = self.group_labels(user_id, type_id, context)
         context.user_data["from_group_map"] = labels_map(group_labels)
         await update.message.reply_text(
             "Select source account group",
@@ -78,19 +124,10 @@ class TransactionCreateMixin:
             return FROM_GROUP
         group_id = group_map[text]
         context.user_data["from_group"] = group_id
-        accounts = self.db.accounts_with_value(update.effective_user.id, group_id)
-        acc_labels = make_labels(accounts)
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (group_id, update.effective_user.id),
-        )
+        acc_labels = self.account_labels(update.effective_user.id, group_id, context)
+        type_name = self.db.account_group_type(update.effective_user.id, group_id)
         extra = ["+ account", "Back", "Cancel"]
-        if row and row["type_name"] == "capital":
+        if type_name == "capital":
             extra = ["Back", "Cancel"]
         context.user_data["from_account_map"] = labels_map(acc_labels)
         context.user_data["account_prefix"] = "from"
@@ -112,8 +149,7 @@ class TransactionCreateMixin:
             )
             return ConversationHandler.END
         if text == "Back":
-            accounts = self.db.accounts_with_value(user_id, gid)
-            acc_labels = make_labels(accounts)
+            acc_labels = self.account_labels(user_id, gid, context)
             acc_map_key = "from_account_map" if prefix == "from" else "to_account_map"
             context.user_data[acc_map_key] = labels_map(acc_labels)
             context.user_data["account_prefix"] = prefix
@@ -123,18 +159,9 @@ class TransactionCreateMixin:
             )
             return FROM_ACCOUNT if prefix == "from" else TO_ACCOUNT
         # prevent adding accounts inside capital type groups
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (gid, user_id),
-        )
-        if row and row["type_name"] == "capital":
-            accounts = self.db.accounts_with_value(user_id, gid)
-            acc_labels = make_labels(accounts)
+        type_name = self.db.account_group_type(user_id, gid)
+        if type_name == "capital":
+            acc_labels = self.account_labels(user_id, gid, context)
             acc_map_key = "from_account_map" if prefix == "from" else "to_account_map"
             context.user_data[acc_map_key] = labels_map(acc_labels)
             context.user_data["account_prefix"] = prefix
@@ -153,7 +180,7 @@ class TransactionCreateMixin:
     async def add_account_value(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         text = update.message.text.strip()
         try:
-            value = float(text)
+            value = parse_amount(text)
         except ValueError:
             await update.message.reply_text("Please enter a number")
             return ADD_ACCOUNT_VALUE
@@ -163,84 +190,12 @@ class TransactionCreateMixin:
         prefix = context.user_data["add_prefix"]
         user_id = update.effective_user.id
 
-        if value != 0:
-            row = self.db.fetchone(
-                """
-                SELECT g.name AS group_name, t.name AS type_name
-                FROM account_groups g
-                JOIN account_types t ON g.type_id=t.id
-                WHERE g.id=? AND g.user_id=?
-                """,
-                (gid, user_id),
-            )
-            if row:
-                gname = row["group_name"]
-                tname = row["type_name"]
-                if tname == "assets":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='assets' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, cap["id"], aid, value)
-                elif tname == "liabilities":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='liabilities' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, aid, cap["id"], value)
-                elif tname == "expenditures":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='expenditures' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, cap["id"], aid, value)
-                elif tname == "income":
-                    cap = self.db.fetchone(
-                        """
-                        SELECT a.id FROM accounts a
-                        JOIN account_groups g ON a.group_id=g.id
-                        JOIN account_types t ON g.type_id=t.id
-                        WHERE a.user_id=? AND t.name='capital' AND g.name='income' AND a.name=?
-                        """,
-                        (user_id, gname),
-                    )
-                    if cap:
-                        self.db.add_transaction(user_id, aid, cap["id"], value)
-                elif tname == "capital":
-                    cap_id = self.db.correction_account(user_id)
-                    self.db.add_transaction(user_id, aid, cap_id, value)
+        await self.writes.submit(user_id, "add_opening_balance", aid, gid, value)
 
-        accounts = self.db.accounts_with_value(user_id, gid)
-        acc_labels = make_labels(accounts)
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (gid, user_id),
-        )
+        acc_labels = self.account_labels(user_id, gid, context)
+        type_name = self.db.account_group_type(user_id, gid)
         extra = ["+ account", "Back", "Cancel"]
-        if row and row["type_name"] == "capital":
+        if type_name == "capital":
             extra = ["Back", "Cancel"]
         acc_map_key = "from_account_map" if prefix == "from" else "to_account_map"
         context.user_data[acc_map_key] = labels_map(acc_labels)
@@ -260,13 +215,8 @@ class TransactionCreateMixin:
             return ConversationHandler.END
         if text == "Back":
             user_id = update.effective_user.id
-            groups = self.db.account_groups_with_value(
-                user_id, context.user_data["from_type"]
-            )
-            group_labels = [
-                {"id": g["id"], "name": f"{g['name']} ({g['value']})"} for g in groups
-            ]
-            context.user_data["from_group_map"] = {lbl["name"]: lbl["id"] for lbl in group_labels}
+            group_labels = self.group_labels(user_id, context.user_data["from_type"], context)
+            context.user_data["from_group_map"] = labels_map(group_labels)
             await update.message.reply_text(
                 "Select source account group",
                 reply_markup=items_reply_keyboard(group_labels, ["Back", "Cancel"], columns=2),
@@ -274,21 +224,13 @@ class TransactionCreateMixin:
             return FROM_GROUP
         if text == "+ account":
             gid = context.user_data["from_group"]
-            row = self.db.fetchone(
-                """
-                SELECT t.name AS type_name
-                FROM account_groups g
-                JOIN account_types t ON g.type_id=t.id
-                WHERE g.id=? AND g.user_id=?
-                """,
-                (gid, update.effective_user.id),
-            )
-            if row and row["type_name"] == "capital":
+            type_name = self.db.account_group_type(update.effective_user.id, gid)
+            if type_name == "capital":
                 await update.message.reply_text("Cannot create accounts in capital type")
                 return FROM_ACCOUNT
             context.user_data["add_prefix"] = context.user_data.get("account_prefix")
             context.user_data["add_group"] = gid
-            await update.message.reply_text("Enter account name", reply_markup=ReplyKeyboardRemove())
+            await update.message.reply_text("Enter account name", reply_markup=REMOVE_KEYBOARD)
             return ADD_ACCOUNT_NAME
         acc_map = context.user_data.get("from_account_map", {})
         if text not in acc_map:
@@ -297,8 +239,7 @@ class TransactionCreateMixin:
         account_id = acc_map[text]
         context.user_data["from_account"] = account_id
         user_id = update.effective_user.id
-        types = self.db.account_types_with_value(user_id)
-        type_labels = make_labels(types)
+        type_labels = self.type_labels(user_id, context)
         context.user_data["to_type_map"] = labels_map(type_labels)
         await update.message.reply_text(
             "Select destination account type",
@@ -314,10 +255,9 @@ class TransactionCreateMixin:
             )
             return ConversationHandler.END
         if text == "Back":
-            accounts = self.db.accounts_with_value(
-                update.effective_user.id, context.user_data["from_group"]
+            acc_labels = self.account_labels(
+                update.effective_user.id, context.user_data["from_group"], context
             )
-            acc_labels = make_labels(accounts)
             context.user_data["from_account_map"] = labels_map(acc_labels)
             context.user_data["account_prefix"] = "from"
             await update.message.reply_text(
@@ -332,8 +272,7 @@ class TransactionCreateMixin:
         type_id = type_map[text]
         context.user_data["to_type"] = type_id
         user_id = update.effective_user.id
-        groups = self.db.account_groups_with_value(user_id, type_id)
-        group_labels = make_labels(groups)
+        group_labels = self.group_labels(user_id, type_id, context)
         context.user_data["to_group_map"] = labels_map(group_labels)
         await update.message.reply_text(
             "Select destination account group",
@@ -350,8 +289,7 @@ class TransactionCreateMixin:
             return ConversationHandler.END
         if text == "Back":
             user_id = update.effective_user.id
-            types = self.db.account_types_with_value(user_id)
-            type_labels = make_labels(types)
+            type_labels = self.type_labels(user_id, context)
             context.user_data["to_type_map"] = labels_map(type_labels)
             await update.message.reply_text(
                 "Select destination account type",
@@ -364,19 +302,10 @@ class TransactionCreateMixin:
             return TO_GROUP
         group_id = group_map[text]
         context.user_data["to_group"] = group_id
-        accounts = self.db.accounts_with_value(update.effective_user.id, group_id)
-        acc_labels = make_labels(accounts)
-        row = self.db.fetchone(
-            """
-            SELECT t.name AS type_name
-            FROM account_groups g
-            JOIN account_types t ON g.type_id=t.id
-            WHERE g.id=? AND g.user_id=?
-            """,
-            (group_id, update.effective_user.id),
-        )
+        acc_labels = self.account_labels(update.effective_user.id, group_id, context)
+        type_name = self.db.account_group_type(update.effective_user.id, group_id)
         extra = ["+ account", "Back", "Cancel"]
-        if row and row["type_name"] == "capital":
+        if type_name == "capital":
             extra = ["Back", "Cancel"]
         context.user_data["to_account_map"] = labels_map(acc_labels)
         context.user_data["account_prefix"] = "to"
@@ -395,10 +324,7 @@ class TransactionCreateMixin:
             return ConversationHandler.END
         if text == "Back":
             user_id = update.effective_user.id
-            groups = self.db.account_groups_with_value(
-                user_id, context.user_data["to_type"]
-            )
-            group_labels = make_labels(groups)
+            group_labels = self.group_labels(user_id, context.user_data["to_type"], context)
             context.user_data["to_group_map"] = labels_map(group_labels)
             await update.message.reply_text(
                 "Select destination account group",
@@ -407,21 +333,13 @@ class TransactionCreateMixin:
             return TO_GROUP
         if text == "+ account":
             gid = context.user_data["to_group"]
-            row = self.db.fetchone(
-                """
-                SELECT t.name AS type_name
-                FROM account_groups g
-                JOIN account_types t ON g.type_id=t.id
-                WHERE g.id=? AND g.user_id=?
-                """,
-                (gid, update.effective_user.id),
-            )
-            if row and row["type_name"] == "capital":
+            type_name = self.db.account_group_type(update.effective_user.id, gid)
+            if type_name == "capital":
                 await update.message.reply_text("Cannot create accounts in capital type")
                 return TO_ACCOUNT
             context.user_data["add_prefix"] = context.user_data.get("account_prefix")
             context.user_data["add_group"] = gid
-            await update.message.reply_text("Enter account name", reply_markup=ReplyKeyboardRemove())
+            await update.message.reply_text("Enter account name", reply_markup=REMOVE_KEYBOARD)
             return ADD_ACCOUNT_NAME
         acc_map = context.user_data.get("to_account_map", {})
         if text not in acc_map:
@@ -431,10 +349,7 @@ class TransactionCreateMixin:
         context.user_data["to_account"] = account_id
         await update.message.reply_text(
             "Enter amount",
-            reply_markup=ReplyKeyboardMarkup(
-                [[KeyboardButton("Back"), KeyboardButton("Cancel")]],
-                resize_keyboard=True,
-            ),
+            reply_markup=AMOUNT_KEYBOARD,
         )
         context.user_data.pop("editing", None)
         return AMOUNT
@@ -446,11 +361,12 @@ class TransactionCreateMixin:
                 "Cancelled", reply_markup=self.main_menu_keyboard()
             )
             return ConversationHandler.END
+        if text == "Back" and context.user_data.get("shortcut"):
+            return await self.start_create_transaction(update, context)
         if text == "Back":
-            accounts = self.db.accounts_with_value(
-                update.effective_user.id, context.user_data["to_group"]
+            acc_labels = self.account_labels(
+                update.effective_user.id, context.user_data["to_group"], context
             )
-            acc_labels = make_labels(accounts)
             context.user_data["to_account_map"] = labels_map(acc_labels)
             context.user_data["account_prefix"] = "to"
             await update.message.reply_text(
@@ -459,14 +375,14 @@ class TransactionCreateMixin:
             )
             return TO_ACCOUNT
         try:
-            amount = float(text)
+            amount = parse_amount(text)
         except ValueError:
             await update.message.reply_text("Please enter a number")
             return AMOUNT
         user_id = update.effective_user.id
         if context.user_data.get("editing"):
             tx_id = context.user_data["tx_id"]
-            self.db.update_transaction_amount(user_id, tx_id, amount)
+            await self.writes.submit(user_id, "update_transaction_amount", tx_id, amount)
             tx = self.db.transaction(user_id, tx_id)
             await update.message.reply_text(
                 format_transaction(tx)
@@ -476,12 +392,11 @@ class TransactionCreateMixin:
             )
             return ConversationHandler.END
         context.user_data["amount"] = amount
+        if context.user_data.get("shortcut"):
+            return await self._save_transaction(update, context, None)
         await update.message.reply_text(
             "Enter date and time (YYYY-MM-DD HH:MM) or 'Now'",
-            reply_markup=ReplyKeyboardMarkup(
-                [[KeyboardButton("Now"), KeyboardButton("Back"), KeyboardButton("Cancel")]],
-                resize_keyboard=True,
-            ),
+            reply_markup=DATETIME_KEYBOARD,
         )
         return TX_DATETIME
 
@@ -495,10 +410,7 @@ class TransactionCreateMixin:
         if text == "Back":
             await update.message.reply_text(
                 "Enter amount",
-                reply_markup=ReplyKeyboardMarkup(
-                    [[KeyboardButton("Back"), KeyboardButton("Cancel")]],
-                    resize_keyboard=True,
-                ),
+                reply_markup=AMOUNT_KEYBOARD,
             )
             return AMOUNT
         if text.lower() == "now":
@@ -513,9 +425,16 @@ class TransactionCreateMixin:
                     "Please use format YYYY-MM-DD HH:MM or 'Now'"
                 )
                 return TX_DATETIME
+        return await self._save_transaction(update, context, ts)
+
+    async def _save_transaction(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE, ts: str | None
+    ) -> int:
+        context.user_data.pop("shortcut", None)
         user_id = update.effective_user.id
-        tx_id = self.db.add_transaction(
+        tx_id = await self.writes.submit(
             user_id,
+            "add_transaction",
             context.user_data["from_account"],
             context.user_data["to_account"],
             context.user_data["amount"],
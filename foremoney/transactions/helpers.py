@@ -3,11 +3,13 @@ from __future__ import annotations
 from typing import Iterable, Mapping, Any
 from datetime import datetime
 
+from ..money import format_amount
+
 
 def make_labels(items: Iterable[Mapping[str, Any]]) -> list[dict[str, Any]]:
     """Return [{"id": id, "name": "name (value)"}, ...] for items with id,name,value."""
     return [
-        {"id": item["id"], "name": f"{item['name']} ({item['value']})"}
+        {"id": item["id"], "name": f"{item['name']} ({format_amount(item['value'])})"}
         for item in items
     ]
 
@@ -38,7 +40,7 @@ def format_transaction(tx: Mapping[str, Any]) -> str:
     return (
         f"from: {f_code} - {data['from_group']} - {data['from_name']}\n"
         f"to: {t_code} - {data['to_group']} - {data['to_name']}\n"
-        f"amount: {data['amount']}\n"
+        f"amount: {format_amount(data['amount'])}\n"
         f"date: {ts}"
     )
 
@@ -48,6 +50,6 @@ def transaction_summary(tx: Mapping[str, Any]) -> str:
     data = dict(tx)
     return (
         f"{data['from_name']} "
-        f"-> {data['amount']} -> "
+        f"-> {format_amount(data['amount'])} -> "
         f"{data['to_name']}"
     )
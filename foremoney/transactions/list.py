@@ -1,15 +1,15 @@
+import asyncio
 from datetime import datetime
 from telegram import (
     Update,
-    InlineKeyboardButton,
     InlineKeyboardMarkup,
     ReplyKeyboardMarkup,
-    KeyboardButton,
 )
 from telegram.ext import ContextTypes, ConversationHandler
 
 from .helpers import format_transaction, transaction_summary
-from ..ui import items_reply_keyboard
+from ..money import parse_amount
+from ..ui import inline_keyboard, items_reply_keyboard, reply_keyboard
 
 from ..states import (
     TX_LIST,
@@ -24,37 +24,58 @@ from ..states import (
     TX_FILTER_ACCOUNT,
 )
 
+PAGE_SIZE = 10
+
+FILTER_MENU_KEYBOARD = reply_keyboard((
+    ("Min date", "Max date"),
+    ("Min amount", "Max amount"),
+    ("Account group", "Account"),
+    ("Archive",),
+    ("Reset filter", "Cancel"),
+))
+TX_ACTIONS_KEYBOARD = inline_keyboard(((("Edit", "edit"),), (("Delete", "delete"),)))
+
+
 class TransactionListMixin:
     """Handlers for listing and editing transactions."""
 
     async def start_transactions(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         context.user_data["tx_filters"] = {}
         context.user_data["tx_offset"] = 0
+        # the main menu keyboard is shown until the filter keyboard replaces it
+        context.user_data["tx_filter_keyboard"] = False
         return await self._send_transactions(update.message, update.effective_user.id, 0, context)
 
+    def _transactions_markup(
+        self, user_id: int, offset: int, context: ContextTypes.DEFAULT_TYPE
+    ) -> InlineKeyboardMarkup | None:
+        filters = context.user_data.get("tx_filters", {})
+        # one extra row tells whether there is a next page
+        txs = list(self.db.transactions(user_id, PAGE_SIZE + 1, offset, filters))
+        rows = [((transaction_summary(tx), f"tx:{tx['id']}"),) for tx in txs[:PAGE_SIZE]]
+        nav = []
+        if offset:
+            nav.append(("Prev", "prev"))
+        if len(txs) > PAGE_SIZE:
+            nav.append(("Next", "next"))
+        if nav:
+            rows.append(tuple(nav))
+        return inline_keyboard(tuple(rows)) if rows else None
+
     async def _send_transactions(
         self, sender, user_id: int, offset: int, context: ContextTypes.DEFAULT_TYPE
     ) -> int:
         msg_obj = sender if hasattr(sender, "reply_text") else sender.message
-        filters = context.user_data.get("tx_filters", {})
-        txs = self.db.transactions(user_id, 10, offset, filters)
-        buttons = [
-            [
-                InlineKeyboardButton(
-                    transaction_summary(tx), callback_data=f"tx:{tx['id']}"
-                )
-            ]
-            for tx in txs
-        ]
-        if txs:
-            buttons.append([InlineKeyboardButton("Next", callback_data="next")])
         await msg_obj.reply_text(
             "Transactions:",
-            reply_markup=InlineKeyboardMarkup(buttons) if buttons else None,
-        )
-        await msg_obj.reply_text(
-            "Filters:", reply_markup=self._filter_menu_keyboard()
+            reply_markup=self._transactions_markup(user_id, offset, context),
         )
+        # reply keyboards stay until replaced, so send it once per session
+        if not context.user_data.get("tx_filter_keyboard"):
+            await msg_obj.reply_text(
+                "Filters:", reply_markup=self._filter_menu_keyboard()
+            )
+            context.user_data["tx_filter_keyboard"] = True
         return TX_LIST
 
     async def tx_filter_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -71,6 +92,14 @@ class TransactionListMixin:
             context.user_data["tx_offset"] = 0
             await update.message.reply_text("Filters reset")
             return await self._send_transactions(update.message, update.effective_user.id, 0, context)
+        if text == "Archive":
+            tx_filters = context.user_data.setdefault("tx_filters", {})
+            tx_filters["archived"] = not tx_filters.get("archived")
+            context.user_data["tx_offset"] = 0
+            await update.message.reply_text(
+                "Archived transactions" if tx_filters["archived"] else "Open period"
+            )
+            return await self._send_transactions(update.message, update.effective_user.id, 0, context)
         if text == "Min date":
             await update.message.reply_text("Enter min date YYYY-MM-DD")
             return TX_FILTER_MIN_DATE
@@ -88,6 +117,7 @@ class TransactionListMixin:
             type_labels = [{"id": t["id"], "name": t["name"]} for t in types]
             context.user_data["tx_type_map"] = {t["name"]: t["id"] for t in types}
             context.user_data["filter_step"] = "group"
+            context.user_data["tx_filter_keyboard"] = False
             await update.message.reply_text(
                 "Select account type",
                 reply_markup=items_reply_keyboard(type_labels, ["Cancel"], columns=2),
@@ -98,6 +128,7 @@ class TransactionListMixin:
             type_labels = [{"id": t["id"], "name": t["name"]} for t in types]
             context.user_data["tx_type_map"] = {t["name"]: t["id"] for t in types}
             context.user_data["filter_step"] = "account"
+            context.user_data["tx_filter_keyboard"] = False
             await update.message.reply_text(
                 "Select account type",
                 reply_markup=items_reply_keyboard(type_labels, ["Cancel"], columns=2),
@@ -137,7 +168,7 @@ class TransactionListMixin:
         if text == "Cancel":
             return await self._send_transactions(update.message, update.effective_user.id, 0, context)
         try:
-            val = float(text)
+            val = parse_amount(text)
             context.user_data.setdefault("tx_filters", {})["min_amount"] = val
         except ValueError:
             await update.message.reply_text("Please enter a number")
@@ -150,7 +181,7 @@ class TransactionListMixin:
         if text == "Cancel":
             return await self._send_transactions(update.message, update.effective_user.id, 0, context)
         try:
-            val = float(text)
+            val = parse_amount(text)
             context.user_data.setdefault("tx_filters", {})["max_amount"] = val
         except ValueError:
             await update.message.reply_text("Please enter a number")
@@ -233,38 +264,40 @@ class TransactionListMixin:
         return await self._send_transactions(update.message, update.effective_user.id, 0, context)
 
     def _filter_menu_keyboard(self) -> ReplyKeyboardMarkup:
-        buttons = [
-            [KeyboardButton("Min date"), KeyboardButton("Max date")],
-            [KeyboardButton("Min amount"), KeyboardButton("Max amount")],
-            [KeyboardButton("Account group"), KeyboardButton("Account")],
-            [KeyboardButton("Reset filter"), KeyboardButton("Cancel")],
-        ]
-        return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        return FILTER_MENU_KEYBOARD
 
     async def tx_list_actions(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
-        await query.answer()
         user_id = update.effective_user.id
-        if query.data == "next":
-            offset = context.user_data.get("tx_offset", 0) + 10
+        if query.data in ("next", "prev"):
+            step = PAGE_SIZE if query.data == "next" else -PAGE_SIZE
+            offset = max(0, context.user_data.get("tx_offset", 0) + step)
+            markup = self._transactions_markup(user_id, offset, context)
+            if markup is None:
+                await query.answer("No more transactions")
+                return TX_LIST
             context.user_data["tx_offset"] = offset
-            await query.message.delete()
-            return await self._send_transactions(query.message, user_id, offset, context)
+            # the page is replaced in place; answering runs in parallel
+            await asyncio.gather(
+                query.answer(), query.edit_message_reply_markup(reply_markup=markup)
+            )
+            return TX_LIST
+        await query.answer()
         if query.data.startswith("tx:"):
             tx_id = int(query.data.split(":")[1])
-            tx = self.db.transaction(user_id, tx_id)
+            archived = context.user_data.get("tx_filters", {}).get("archived", False)
+            tx = self.db.transaction(user_id, tx_id, archived=archived)
             if not tx:
                 await query.message.reply_text("Transaction not found")
                 return TX_LIST
+            if archived:
+                # closed periods are read-only
+                await query.message.reply_text(format_transaction(tx))
+                return TX_LIST
             context.user_data["tx_id"] = tx_id
             await query.message.reply_text(
                 format_transaction(tx),
-                reply_markup=InlineKeyboardMarkup(
-                    [
-                        [InlineKeyboardButton("Edit", callback_data="edit")],
-                        [InlineKeyboardButton("Delete", callback_data="delete")],
-                    ]
-                ),
+                reply_markup=TX_ACTIONS_KEYBOARD,
             )
             return TX_DETAILS
         return TX_LIST
@@ -275,7 +308,7 @@ class TransactionListMixin:
         user_id = update.effective_user.id
         tx_id = context.user_data.get("tx_id")
         if query.data == "delete" and tx_id:
-            self.db.delete_transaction(user_id, tx_id)
+            await self.writes.submit(user_id, "delete_transaction", tx_id)
             await query.message.reply_text("Transaction deleted")
             return ConversationHandler.END
         if query.data == "edit" and tx_id:
@@ -286,23 +319,18 @@ class TransactionListMixin:
 
     async def tx_edit_amount(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         try:
-            amount = float(update.message.text)
+            amount = parse_amount(update.message.text)
         except ValueError:
             await update.message.reply_text("Please enter a number")
             return TX_EDIT_AMOUNT
         user_id = update.effective_user.id
         tx_id = context.user_data.get("tx_id")
         if tx_id:
-            self.db.update_transaction_amount(user_id, tx_id, amount)
+            await self.writes.submit(user_id, "update_transaction_amount", tx_id, amount)
             tx = self.db.transaction(user_id, tx_id)
             await update.message.reply_text(
                 format_transaction(tx),
-                reply_markup=InlineKeyboardMarkup(
-                    [
-                        [InlineKeyboardButton("Edit", callback_data="edit")],
-                        [InlineKeyboardButton("Delete", callback_data="delete")],
-                    ]
-                ),
+                reply_markup=TX_ACTIONS_KEYBOARD,
             )
             return TX_DETAILS
         return ConversationHandler.END
@@ -2,10 +2,34 @@ from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
     KeyboardButton,
 )
+from functools import lru_cache
 from typing import Iterable, Mapping, Sequence
 
+# Telegram objects are frozen, so one keyboard instance can be sent any
+# number of times; equal layouts share it instead of being rebuilt.
+
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+
+@lru_cache(maxsize=1024)
+def reply_keyboard(rows: tuple[tuple[str, ...], ...]) -> ReplyKeyboardMarkup:
+    """Return the shared ReplyKeyboardMarkup with ``rows`` of button labels."""
+    return ReplyKeyboardMarkup(
+        [[KeyboardButton(label) for label in row] for row in rows],
+        resize_keyboard=True,
+    )
+
+
+@lru_cache(maxsize=256)
+def inline_keyboard(rows: tuple[tuple[tuple[str, str], ...], ...]) -> InlineKeyboardMarkup:
+    """Return the shared InlineKeyboardMarkup with rows of (text, callback data)."""
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in rows]
+    )
+
 
 def items_keyboard(items: Iterable[Mapping], prefix: str, extra_buttons: Sequence[InlineKeyboardButton] | None = None) -> InlineKeyboardMarkup:
     """Create InlineKeyboardMarkup from DB rows.
@@ -37,26 +61,13 @@ def items_reply_keyboard(
     ``columns`` controls how many buttons are placed in a single row.
     ``extra_columns`` controls how many extra buttons are placed per row. If
     ``None`` they all appear on a single row for backwards compatibility.
+    The markup is shared with earlier calls that had the same labels and layout.
     """
-    buttons: list[list[KeyboardButton]] = []
-    row: list[KeyboardButton] = []
-    for idx, item in enumerate(items, 1):
-        row.append(KeyboardButton(str(item["name"])))
-        if idx % columns == 0:
-            buttons.append(row)
-            row = []
-    if row:
-        buttons.append(row)
+    names = [str(item["name"]) for item in items]
+    rows = [tuple(names[i:i + columns]) for i in range(0, len(names), columns)]
     if extra_labels:
-        if extra_columns is None:
-            buttons.append([KeyboardButton(lbl) for lbl in extra_labels])
-        else:
-            row = []
-            for idx, lbl in enumerate(extra_labels, 1):
-                row.append(KeyboardButton(lbl))
-                if idx % extra_columns == 0:
-                    buttons.append(row)
-                    row = []
-            if row:
-                buttons.append(row)
-    return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        step = extra_columns or len(extra_labels)
+        rows.extend(
+            tuple(extra_labels[i:i + step]) for i in range(0, len(extra_labels), step)
+        )
+    return reply_keyboard(tuple(rows))
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Hashable
+
+from telegram.ext import BaseUpdateProcessor
+
+from .locks import KeyedLocks
+from .profiling import Profiler
+from .tracing import QueryTracer
+
+
+def update_key(update: object) -> Hashable | None:
+    """Return the key whose updates must be handled one at a time."""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return ("user", user.id)
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    return None
+
+
+class BotUpdateProcessor(BaseUpdateProcessor):
+    """Process updates of different users concurrently, each user's in order.
+
+    Every update first takes its user's lock, so conversation state
+    transitions of one user never interleave, and then one of
+    ``max_concurrent_updates`` slots. Updates waiting for their user's lock
+    do not hold a slot; at most ``max_pending`` updates are accepted at once.
+
+    With a tracer every update is processed inside its own
+    :class:`~foremoney.tracing.UpdateTrace`; while the profiler is active
+    updates also run under its ``cProfile`` window.
+    """
+
+    def __init__(
+        self,
+        tracer: QueryTracer | None = None,
+        profiler: Profiler | None = None,
+        max_concurrent_updates: int = 1,
+        max_pending: int = 256,
+    ) -> None:
+        super().__init__(max(max_pending, max_concurrent_updates))
+        self.tracer = tracer
+        self.profiler = profiler
+        self.user_locks = KeyedLocks()
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self.in_flight = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_key(update)
+        if key is None:
+            async with self._slots:
+                await self._run(update, coroutine)
+            return
+        async with self.user_locks.hold(key), self._slots:
+            await self._run(update, coroutine)
+
+    async def _run(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.in_flight += 1
+        profiled = self.profiler is not None and self.profiler.active
+        if profiled:
+            self.profiler.enter()
+        try:
+            if self.tracer is None:
+                await coroutine
+                return
+            token = self.tracer.begin(getattr(update, "update_id", None))
+            try:
+                await coroutine
+            finally:
+                self.tracer.end(token)
+        finally:
+            if profiled:
+                self.profiler.exit()
+            self.in_flight -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
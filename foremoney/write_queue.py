@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any
+
+from .locks import KeyedLocks
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """Group commit of storage writes coming from concurrent handlers.
+
+    Handlers ``await submit(user_id, "method", ...)`` instead of calling the
+    storage directly. A writer task collects requests for at most
+    ``max_latency`` seconds (or ``max_batch`` requests), applies them in one
+    SQLite transaction per database file and resolves every caller's future
+    with the method's result or exception. Each request runs in its own
+    savepoint, so one failing write does not undo the rest of the batch.
+
+    Handlers that read before they write take the family's lock with
+    :meth:`exclusive`: it waits for the family's queued writes and holds
+    back new ones until the block ends (so it must not ``submit`` itself).
+    """
+
+    def __init__(self, db: Storage, max_latency: float = 0.01, max_batch: int = 200) -> None:
+        self.db = db
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.family_locks = KeyedLocks()
+        self._pending: dict[int, set[asyncio.Future]] = {}
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="write_queue")
+
+    async def stop(self) -> None:
+        """Apply queued writes and stop the writer task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            self._apply(pending)
+
+    @asynccontextmanager
+    async def exclusive(self, user_id: int):
+        """Hold the lock of the user's family: no queued write of it runs meanwhile."""
+        family_id = self.db.family_id(user_id)
+        async with self.family_locks.hold(family_id):
+            pending = self._pending.get(family_id)
+            if pending:
+                await asyncio.wait(list(pending))
+            yield
+
+    async def submit(self, user_id: int, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run ``db.<method>(user_id, *args, **kwargs)`` in the next batch."""
+        family_id = self.db.family_id(user_id)
+        if self.family_locks.locked(family_id):
+            async with self.family_locks.hold(family_id):
+                pass
+        if self._task is None:
+            # not started (e.g. disabled or during shutdown): write directly
+            return getattr(self.db, method)(user_id, *args, **kwargs)
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(family_id, set())
+        pending.add(future)
+        future.add_done_callback(lambda f: self._done(family_id, f))
+        self._queue.put_nowait((user_id, method, args, kwargs, future))
+        return await future
+
+    def _done(self, family_id: int, future: asyncio.Future) -> None:
+        pending = self._pending.get(family_id)
+        if pending is not None:
+            pending.discard(future)
+            if not pending:
+                del self._pending[family_id]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+            try:
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            finally:
+                # also on cancellation, so collected callers are not left waiting
+                self._apply(batch)
+
+    def _apply(self, batch: list[tuple]) -> None:
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        # writes of different shards go to different files and transactions
+        by_target: dict[int, tuple[Storage, list]] = {}
+        for user_id, method, args, kwargs, future in batch:
+            target = self.db.shard_for(user_id)
+            family_id = self.db.family_id(user_id)
+            by_target.setdefault(id(target), (target, []))[1].append(
+                (family_id, method, args, kwargs, future)
+            )
+        for target, items in by_target.values():
+            results = []
+            try:
+                with target.batch():
+                    for family_id, method, args, kwargs, future in items:
+                        try:
+                            with target.atomic():
+                                value = getattr(target, method)(family_id, *args, **kwargs)
+                        except Exception as exc:
+                            results.append((future, None, exc))
+                        else:
+                            results.append((future, value, None))
+            except Exception as exc:
+                logger.exception("Batch of %d writes failed", len(items))
+                results = [(item[-1], None, exc) for item in items]
+            for future, value, exc in results:
+                if future.done():
+                    continue
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(value)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "largest_batch": self.largest_batch,
+        }